@@ -0,0 +1,93 @@
+"""
+Benchmark: FSM throughput of fleet_control.FleetController against one
+control.RoomController per room.
+
+Both are fed the same random occupancy / temperature / light readings
+(temperatures around the 24 and 28 °C thresholds, so every transition is
+exercised) and timed. tests/test_fleet_control.py checks that their
+decisions match.
+
+Usage:
+    python benchmarks/bench_fleet_control.py
+    python benchmarks/bench_fleet_control.py --rooms 1000 10000 100000 --steps 288
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from control import RoomController
+from fleet_control import AC_STATES, LIGHT_STATES, FleetController
+
+
+def _readings(rng, steps, rooms):
+    occupied = rng.random((steps, rooms)) < 0.5
+    temp = np.round(rng.uniform(20.0, 32.0, (steps, rooms)), 2)
+    light = rng.integers(0, 1024, (steps, rooms))
+    # A few readings exactly on the thresholds
+    temp[rng.random((steps, rooms)) < 0.05] = 28.0
+    temp[rng.random((steps, rooms)) < 0.05] = 24.0
+    light[rng.random((steps, rooms)) < 0.05] = 300
+    return occupied, temp, light
+
+
+def _run_scalar(occupied, temp, light):
+    steps, rooms = occupied.shape
+    controllers = [RoomController(f"Room {i + 1}") for i in range(rooms)]
+    ac_out = np.empty((steps, rooms), dtype=np.int8)
+    light_out = np.empty((steps, rooms), dtype=np.int8)
+    for t in range(steps):
+        for i, controller in enumerate(controllers):
+            controller.update({'sensor_type': 'temperature', 'value': float(temp[t, i])})
+            controller.update({'sensor_type': 'pir', 'occupied': bool(occupied[t, i])})
+            controller.update({'sensor_type': 'ldr', 'value': int(light[t, i])})
+            ac_state, light_state = controller.evaluate_state()
+            ac_out[t, i] = AC_STATES.index(ac_state)
+            light_out[t, i] = LIGHT_STATES.index(light_state)
+    return ac_out, light_out
+
+
+def _run_fleet(occupied, temp, light):
+    steps, rooms = occupied.shape
+    fleet = FleetController(rooms)
+    ac_out = np.empty((steps, rooms), dtype=np.int8)
+    light_out = np.empty((steps, rooms), dtype=np.int8)
+    for t in range(steps):
+        ac_out[t], light_out[t] = fleet.step(occupied[t], temp[t], light[t])
+    return ac_out, light_out
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, nargs="+", default=[100, 1_000, 10_000],
+                        help="fleet sizes to measure at")
+    parser.add_argument("--steps", type=int, default=288, help="ticks per measurement")
+    parser.add_argument("--scalar-limit", type=int, default=10_000,
+                        help="skip the scalar run above this many rooms")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'rooms':>8} {'scalar ticks/s':>15} {'fleet ticks/s':>14} {'speedup':>8}")
+    for rooms in args.rooms:
+        readings = _readings(rng, args.steps, rooms)
+        room_ticks = args.steps * rooms
+        fleet_rate = room_ticks / _time(_run_fleet, *readings)
+        if rooms <= args.scalar_limit:
+            scalar_rate = room_ticks / _time(_run_scalar, *readings)
+            print(f"{rooms:>8,} {scalar_rate:>15,.0f} {fleet_rate:>14,.0f} {fleet_rate / scalar_rate:>7.1f}x")
+        else:
+            print(f"{rooms:>8,} {'-':>15} {fleet_rate:>14,.0f} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark: query latency of the hot database.py / analytics.py queries as
+sensor_log and appliance_log grow, with and without the migration indexes.
+
+Two scratch databases are filled side by side: one migrated (indexed) and one
+with the bare tables only. After each size step the same queries are timed
+on both. With the indexes, latency should stay roughly flat as the tables grow;
+without them every query is a full table scan.
+
+Usage:
+    python benchmarks/bench_indexes.py
+    python benchmarks/bench_indexes.py --sizes 10000 100000 1000000 5000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import migrations
+from database import step_to_ms
+
+ROOMS = ["Living Room", "Bedroom", "Kitchen", "Study"]
+SENSOR_TYPES = ["temperature", "pir", "ldr"]
+APPLIANCES = ["AC", "Light"]
+
+# The exact query shapes issued on the hot paths
+QUERIES = {
+    "sensor_history": (
+        '''SELECT value, timestamp FROM sensor_log
+           WHERE room_id = ? AND sensor_type = ?
+           ORDER BY timestamp DESC LIMIT 50''',
+        ("Kitchen", "temperature"),
+    ),
+    "last_appliance_state": (
+        '''SELECT is_on FROM appliance_log
+           WHERE room_id=? AND appliance=?
+           ORDER BY timestamp DESC LIMIT 1''',
+        ("Kitchen", "AC"),
+    ),
+    "first_appliance_event": (
+        '''SELECT state, is_on, timestamp FROM appliance_log
+           WHERE room_id = ? AND appliance = ?
+           ORDER BY timestamp ASC LIMIT 1''',
+        ("Kitchen", "AC"),
+    ),
+}
+
+CREATE_TABLES = [
+    '''CREATE TABLE sensor_log (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           room_id TEXT, sensor_type TEXT, value REAL, timestamp DATETIME)''',
+    '''CREATE TABLE appliance_log (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           room_id TEXT, appliance TEXT, state TEXT, is_on INTEGER, timestamp DATETIME)''',
+    '''CREATE TABLE energy_log (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           room_id TEXT, appliance TEXT, kwh REAL, period_start DATETIME, period_end DATETIME)''',
+]
+
+
+def _open(path, indexed):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    for statement in CREATE_TABLES:
+        conn.execute(statement)
+    conn.commit()
+    if indexed:
+        migrations.migrate(conn)
+    return conn
+
+
+def _fill(conns, start_step, end_step, rng):
+    """Appends one sensor row per room/type and one appliance row per room/appliance per step."""
+    sensor_rows = []
+    appliance_rows = []
+    for step in range(start_step, end_step):
+        ts = step_to_ms(step)
+        for room in ROOMS:
+            for sensor_type in SENSOR_TYPES:
+                sensor_rows.append((room, sensor_type, rng.uniform(0, 40), ts))
+            for appliance in APPLIANCES:
+                is_on = step % 2
+                appliance_rows.append((room, appliance, "ON" if is_on else "OFF", is_on, ts))
+    for conn in conns:
+        conn.executemany("INSERT INTO sensor_log (room_id, sensor_type, value, timestamp) VALUES (?, ?, ?, ?)",
+                         sensor_rows)
+        conn.executemany('''INSERT INTO appliance_log (room_id, appliance, state, is_on, timestamp)
+                            VALUES (?, ?, ?, ?, ?)''', appliance_rows)
+        conn.commit()
+
+
+def _time_query(conn, sql, params, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="sensor_log row counts to measure at")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions per query (best is kept)")
+    args = parser.parse_args()
+
+    rows_per_step = len(ROOMS) * len(SENSOR_TYPES)
+    rng = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        indexed = _open(os.path.join(tmp, "indexed.db"), indexed=True)
+        plain = _open(os.path.join(tmp, "plain.db"), indexed=False)
+
+        print(f"{'sensor rows':>12} {'query':<22} {'indexed ms':>11} {'no index ms':>12}")
+        step = 0
+        for size in sorted(args.sizes):
+            target_step = size // rows_per_step
+            _fill([indexed, plain], step, target_step, rng)
+            step = target_step
+            for name, (sql, params) in QUERIES.items():
+                with_index = _time_query(indexed, sql, params, args.repeat)
+                without_index = _time_query(plain, sql, params, args.repeat)
+                print(f"{size:>12,} {name:<22} {with_index:>11.3f} {without_index:>12.3f}")
+
+        indexed.close()
+        plain.close()
+
+
+if __name__ == "__main__":
+    main()
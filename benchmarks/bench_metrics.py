@@ -0,0 +1,69 @@
+"""
+Benchmark: overhead of the metrics instrumentation (src/metrics.py) on the
+simulation hot path.
+
+Runs the in-process SimulationEngine on scratch databases with metrics
+enabled and disabled, alternating, and reports room ticks per second and the
+added cost per room tick. Each room tick records about a dozen stage timings
+(tick, sensor_read, 3 x observer_fanout and datalogger_update, fsm_evaluate,
+2 x appliance_log, ...) plus the SQL statement and row counters.
+
+Usage:
+    python benchmarks/bench_metrics.py
+    python benchmarks/bench_metrics.py --days 3 --rooms 20 --repeats 5
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import database as db
+import metrics
+from simulation import STEPS_PER_DAY, SimulationEngine, rooms_config_for
+
+
+def run_once(work_dir, name, days, rooms, enabled):
+    metrics.set_enabled(enabled)
+    path = os.path.join(work_dir, f"{name}.db")
+    db.use_database(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.init_db()
+        engine = SimulationEngine(rooms_config_for(rooms), seed=1)
+        start = time.perf_counter()
+        engine.run(days)
+        elapsed = time.perf_counter() - start
+        engine.close()
+    db.close_connections()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--rooms", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=5, help="runs per setting, alternating")
+    args = parser.parse_args()
+
+    ticks = args.days * STEPS_PER_DAY * args.rooms
+    times = {True: [], False: []}
+    with tempfile.TemporaryDirectory() as work_dir:
+        run_once(work_dir, "warmup", 1, args.rooms, True)
+        for i in range(args.repeats):
+            for enabled in (False, True):
+                times[enabled].append(run_once(work_dir, f"run{i}-{enabled}", args.days, args.rooms, enabled))
+    metrics.set_enabled(True)
+
+    off, on = statistics.median(times[False]), statistics.median(times[True])
+    print(f"{ticks:,} room ticks per run, median of {args.repeats} runs")
+    print(f"metrics off: {ticks / off:>10,.0f} ticks/s")
+    print(f"metrics on:  {ticks / on:>10,.0f} ticks/s")
+    print(f"overhead:    {(on - off) / ticks * 1e6:>10.2f} us per room tick ({(on / off - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
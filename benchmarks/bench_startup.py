@@ -0,0 +1,85 @@
+"""
+Benchmark: cold start of an API worker.
+
+Each run is a fresh Python process, like a newly booted gunicorn worker,
+against a new database directory. It times:
+  import     importing app (Flask, database, simulation, ...)
+  factory    create_app()
+  1st tick   the first POST /api/tick: builds the default home (migrations,
+             controllers, sensors) and starts the ingest writer
+  2nd tick   a steady-state tick, for comparison
+  analytics  the first GET /api/analytics, which loads analytics and NumPy
+and reports whether NumPy / matplotlib were already loaded when the first
+tick was served (they should not be).
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --rooms 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Runs in the child process; prints one JSON line of timings (seconds)
+CHILD = r"""
+import contextlib, io, json, os, sys, time
+sys.path.insert(0, sys.argv[1])
+timings = {}
+start = time.perf_counter()
+import app
+timings["import"] = time.perf_counter() - start
+
+start = time.perf_counter()
+flask_app = app.create_app({"SHEMS_DB": os.path.join(sys.argv[2], "bench.db"),
+                            "SHEMS_HOMES_DIR": os.path.join(sys.argv[2], "homes"),
+                            "SHEMS_ROOMS": sys.argv[3], "SHEMS_SEED": 1})
+timings["factory"] = time.perf_counter() - start
+client = flask_app.test_client()
+
+with contextlib.redirect_stdout(io.StringIO()):
+    for step, key in ((0, "1st tick"), (1, "2nd tick")):
+        start = time.perf_counter()
+        response = client.post("/api/tick", json={"step": step, "room_id": "Living Room"})
+        timings[key] = time.perf_counter() - start
+        assert response.status_code == 200, response.get_data(as_text=True)
+    lazy = {"numpy": "numpy" in sys.modules, "matplotlib": "matplotlib" in sys.modules}
+
+    start = time.perf_counter()
+    assert client.get("/api/analytics").status_code == 200
+    timings["analytics"] = time.perf_counter() - start
+print(json.dumps({"timings": timings, "loaded_at_first_tick": lazy}))
+"""
+
+
+def run_once(rooms):
+    with tempfile.TemporaryDirectory() as work_dir:
+        out = subprocess.run([sys.executable, "-c", CHILD, SRC, work_dir, str(rooms)],
+                             capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes to start")
+    parser.add_argument("--rooms", type=int, default=4, help="rooms in the default home")
+    args = parser.parse_args()
+
+    results = [run_once(args.rooms) for _ in range(args.runs)]
+    print(f"{'phase':>10} {'median ms':>10} {'max ms':>8}")
+    for phase in results[0]["timings"]:
+        values = [result["timings"][phase] * 1000 for result in results]
+        print(f"{phase:>10} {statistics.median(values):>10.1f} {max(values):>8.1f}")
+    boot = [(r["timings"]["import"] + r["timings"]["factory"] + r["timings"]["1st tick"]) * 1000 for r in results]
+    print(f"Boot to first tick: median {statistics.median(boot):.1f} ms")
+    for module, loaded in results[0]["loaded_at_first_tick"].items():
+        print(f"{module} loaded before first tick: {'yes' if loaded else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
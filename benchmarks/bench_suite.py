@@ -0,0 +1,316 @@
+"""
+Benchmark suite: tick throughput, ingestion rate and query latency against
+homes with 1 day, 1 year and 10 years of history. Results are written to
+JSON, so runs on different commits can be compared.
+
+Each dataset is a SQLite file holding N rooms x days of synthetic history:
+  - sensor_log: one temperature, PIR and LDR reading per room every 5 minutes
+  - appliance_log: two AC and one light ON/OFF cycle per room and day
+It is generated from a fixed seed and then migrated like any older database,
+which builds the indexes, energy_log and sensor_rollup from the raw logs.
+Datasets are kept in --data-dir when one is given, so later runs (e.g. on
+another commit) measure the same data. Each dataset is measured on a scratch
+copy, in a fresh process:
+  open                   database.init_db() on the copy: migrations check and tracker warm-up (ms)
+  calculate_energy       database.calculate_energy latency (ms)
+  get_sensor_history     database.get_sensor_history latency (ms)
+  get_dashboard_payload  analytics.get_dashboard_payload latency, uncached (ms)
+  datalogger             DataLogger rows/s, unbuffered (one commit per reading) and buffered
+  advance_simulation     POST /api/tick requests/s through the Flask app (default
+                         config), continuing after the history; the first tick,
+                         which builds and restores the home, is reported apart
+
+Generating the 10-year dataset takes about 40 s and 400 MB per room.
+
+Usage:
+    python benchmarks/bench_suite.py --datasets 1d 1y --output before.json
+    python benchmarks/bench_suite.py --datasets 1d 1y --output after.json --compare before.json
+    python benchmarks/bench_suite.py --rooms 8 --data-dir bench_data
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+import database as db
+import migrations
+from simulation import STEPS_PER_DAY, rooms_config_for
+
+DATASETS = {"1d": 1, "1y": 365, "10y": 3650}
+# Bump when the generated data changes, so cached datasets are rebuilt
+DATASET_VERSION = 2
+SENSOR_TYPES = ("temperature", "pir", "ldr")
+
+# The tables as the first schema created them; migrations build the rest
+CREATE_TABLES = [
+    '''CREATE TABLE sensor_log (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           room_id TEXT, sensor_type TEXT, value REAL, timestamp DATETIME)''',
+    '''CREATE TABLE appliance_log (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           room_id TEXT, appliance TEXT, state TEXT, is_on INTEGER, timestamp DATETIME)''',
+    '''CREATE TABLE energy_log (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           room_id TEXT, appliance TEXT, kwh REAL, period_start DATETIME, period_end DATETIME)''',
+]
+
+
+def _sensor_rows(rooms_config, days, rng):
+    """Readings in step order: a daily temperature and light curve plus noise, random occupancy."""
+    for step in range(days * STEPS_PER_DAY):
+        ts = db.step_to_ms(step)
+        daylight = math.sin(math.pi * ((step % STEPS_PER_DAY) / STEPS_PER_DAY * 24 - 6) / 12)
+        for room_id, base_temp in rooms_config.items():
+            yield room_id, "temperature", round(base_temp + 3 * daylight + rng.gauss(0, 0.5), 2), ts
+            yield room_id, "pir", 1 if rng.random() < 0.4 else 0, ts
+            yield room_id, "ldr", max(0, int(800 * daylight)) + rng.randint(0, 50), ts
+
+
+def _appliance_rows(rooms_config, days, rng):
+    """Transitions only, as log_appliance_state writes them: AC at midday and afternoon, lights in the evening."""
+    for day in range(days):
+        first = day * STEPS_PER_DAY
+        for room_id in rooms_config:
+            # The two AC windows never overlap: the first is off by 13:55
+            ac_on = first + rng.randint(132, 144)               # 11:00-12:00
+            ac_off = ac_on + rng.randint(6, 23)
+            ac_on_2 = first + rng.randint(168, 192)             # 14:00-16:00
+            ac_off_2 = ac_on_2 + rng.randint(12, 36)
+            light_on = first + rng.randint(216, 240)            # 18:00-20:00
+            light_off = first + rng.randint(264, STEPS_PER_DAY - 1)
+            for appliance, state, is_on, step in (
+                    ("AC", "COOLING", 1, ac_on), ("AC", "STANDBY", 0, ac_off),
+                    ("AC", "COOLING", 1, ac_on_2), ("AC", "STANDBY", 0, ac_off_2),
+                    ("Light", "ON", 1, light_on), ("Light", "OFF", 0, light_off)):
+                yield room_id, appliance, state, is_on, db.step_to_ms(step)
+
+
+def generate_dataset(path, rooms, days, seed):
+    """Writes a migrated dataset of rooms x days to path."""
+    rooms_config = rooms_config_for(rooms)
+    rng = random.Random(f"{seed}:{rooms}:{days}")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    for statement in CREATE_TABLES:
+        conn.execute(statement)
+    conn.executemany("INSERT INTO sensor_log (room_id, sensor_type, value, timestamp) VALUES (?, ?, ?, ?)",
+                     _sensor_rows(rooms_config, days, rng))
+    conn.executemany('''INSERT INTO appliance_log (room_id, appliance, state, is_on, timestamp)
+                        VALUES (?, ?, ?, ?, ?)''', _appliance_rows(rooms_config, days, rng))
+    conn.commit()
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrations.migrate(conn)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+def _latency(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"min_ms": min(samples), "median_ms": statistics.median(samples), "max_ms": max(samples)}
+
+
+def _readings(room_ids, count, first_step):
+    """count DataLogger notifications, every sensor of every room per step from first_step."""
+    per_step = len(room_ids) * len(SENSOR_TYPES)
+    return [{"room": room_ids[i % len(room_ids)], "sensor_type": SENSOR_TYPES[i // len(room_ids) % len(SENSOR_TYPES)],
+             "value": 25.0, "hour": (first_step + i // per_step) * 5 / 60.0} for i in range(count)]
+
+
+def _datalogger_rate(room_ids, count, first_step, buffered):
+    readings = _readings(room_ids, count, first_step)
+    logger = db.DataLogger(buffered=buffered)
+    start = time.perf_counter()
+    for reading in readings:
+        logger.update(reading)
+    logger.close()
+    return count / (time.perf_counter() - start)
+
+
+def measure(path, args):
+    """Runs every measurement on the dataset copy at path; returns the results dict."""
+    room_ids = list(rooms_config_for(args.rooms))
+    room_id = room_ids[-1]
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        db.use_database(path)
+        db.init_db()
+        results["open_ms"] = (time.perf_counter() - start) * 1000
+        last_step = db.ms_to_step(db.get_connection().execute("SELECT MAX(timestamp) FROM sensor_log").fetchone()[0])
+
+        # Reads first, while the copy holds exactly the generated history
+        results["calculate_energy"] = _latency(lambda: db.calculate_energy(room_id, "AC"), args.repeat)
+        results["get_sensor_history"] = _latency(lambda: db.get_sensor_history(room_id, "temperature"), args.repeat)
+        import analytics
+        results["get_dashboard_payload"] = _latency(analytics.get_dashboard_payload, args.repeat)
+
+        # Before the app exists: it routes unbuffered DataLogger writes to its ingest queue
+        steps = -(-args.rows // (len(room_ids) * len(SENSOR_TYPES)))
+        results["datalogger"] = {
+            "unbuffered_rows_per_s": _datalogger_rate(room_ids, args.rows, last_step + 1, buffered=False),
+            "buffered_rows_per_s": _datalogger_rate(room_ids, args.rows, last_step + 1 + steps, buffered=True),
+        }
+
+        import app
+        flask_app = app.create_app({"SHEMS_DB": path, "SHEMS_HOMES_DIR": os.path.join(os.path.dirname(path), "homes"),
+                                    "SHEMS_ROOMS": args.rooms, "SHEMS_SEED": args.seed})
+        client = flask_app.test_client()
+        first_step = last_step + 1 + 2 * steps
+        ticks = [{"step": first_step + 1 + i // len(room_ids), "room_id": room_ids[i % len(room_ids)]}
+                 for i in range(args.ticks)]
+        start = time.perf_counter()
+        response = client.post("/api/tick", json={"step": first_step, "room_id": room_ids[0]})
+        first_tick_ms = (time.perf_counter() - start) * 1000
+        assert response.status_code == 200, response.get_data(as_text=True)
+        start = time.perf_counter()
+        for body in ticks:
+            response = client.post("/api/tick", json=body)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        db.flush_pending_writes()  # the ingest queue's backlog counts too
+        results["advance_simulation"] = {"first_tick_ms": first_tick_ms,
+                                         "ticks_per_s": args.ticks / (time.perf_counter() - start)}
+    return results
+
+
+def _dataset_path(data_dir, label, rooms, seed):
+    return os.path.join(data_dir, f"shems_{label}_{rooms}rooms_seed{seed}_v{DATASET_VERSION}.db")
+
+
+def run_dataset(label, args, data_dir, work_dir):
+    """Generates (or reuses) a dataset and measures a scratch copy of it in a child process."""
+    path = _dataset_path(data_dir, label, args.rooms, args.seed)
+    entry = {"days": DATASETS[label], "rooms": args.rooms, "generate_s": None}
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        generate_dataset(path + ".tmp", args.rooms, DATASETS[label], args.seed)
+        os.replace(path + ".tmp", path)
+        entry["generate_s"] = time.perf_counter() - start
+    with sqlite3.connect(path) as conn:
+        entry["rows"] = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                         for table in ("sensor_log", "appliance_log", "energy_log")}
+    entry["size_mb"] = os.path.getsize(path) / 2 ** 20
+
+    work = os.path.join(work_dir, "work.db")
+    shutil.copyfile(path, work)
+    try:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", work,
+                              "--rooms", str(args.rooms), "--seed", str(args.seed), "--ticks", str(args.ticks),
+                              "--rows", str(args.rows), "--repeat", str(args.repeat)],
+                             capture_output=True, text=True, check=True)
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work + suffix):
+                os.remove(work + suffix)
+    entry["results"] = json.loads(out.stdout.strip().splitlines()[-1])
+    return entry
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results, prefix=""):
+    """{"1y.get_dashboard_payload.median_ms": value, ...} for every number in results."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def _metrics_of(report):
+    return _flatten({label: entry["results"] for label, entry in report["datasets"].items()})
+
+
+def print_report(report, baseline=None):
+    new = _metrics_of(report)
+    old = _metrics_of(baseline) if baseline else {}
+    if old:
+        print(f"{'metric':<52} {'baseline':>12} {'this run':>12} {'change':>8}")
+    else:
+        print(f"{'metric':<52} {'value':>12}")
+    for name, value in new.items():
+        if name in old:
+            change = f"{(value - old[name]) / old[name] * 100:+.1f}%" if old[name] else "n/a"
+            print(f"{name:<52} {old[name]:>12.3f} {value:>12.3f} {change:>8}")
+        elif old:
+            print(f"{name:<52} {'-':>12} {value:>12.3f}")
+        else:
+            print(f"{name:<52} {value:>12.3f}")
+    if old:
+        print("(_ms: lower is better; _per_s: higher is better)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=list(DATASETS),
+                        help="history lengths to measure")
+    parser.add_argument("--rooms", type=int, default=4, help="rooms per dataset")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the generated data and of the ticked sensors")
+    parser.add_argument("--ticks", type=int, default=2000, help="/api/tick requests to time")
+    parser.add_argument("--rows", type=int, default=5000, help="DataLogger readings to time per mode")
+    parser.add_argument("--repeat", type=int, default=20, help="calls per latency measurement")
+    parser.add_argument("--data-dir", help="keep generated datasets here and reuse them (default: a temporary directory)")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--compare", metavar="JSON", help="results of an earlier run to compare with")
+    parser.add_argument("--measure", metavar="DB", help=argparse.SUPPRESS)  # child process entry point
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args)))
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report = {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "options": {"rooms": args.rooms, "seed": args.seed, "ticks": args.ticks, "rows": args.rows,
+                    "repeat": args.repeat, "dataset_version": DATASET_VERSION},
+        "datasets": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        for label in args.datasets:
+            print(f"{label}: {args.rooms} rooms x {DATASETS[label]} days ...", flush=True)
+            report["datasets"][label] = run_dataset(label, args, data_dir, tmp)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report, baseline)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,125 +2,146 @@
 Energy analytics module for SHEMS.
 Pulls appliance ON/OFF data, calculates energy, savings, and prepares dashboard JSON.
 """
-import sqlite3
-from datetime import datetime
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import appliances
+import database as db
+import metrics
+from tariff import Tariff, cost_breakdown
 
 # Constants (aligned with app.py: 4 rooms, 288 steps of 5 min = 24h)
-POWER_RATINGS = {"AC": 1.5, "Light": 0.06}  # kW
 TARIFF_NGN_PER_KWH = 68  # Band A
 OCCUPIED_HOURS = 15  # 8-22
 UNOCCUPIED_HOURS = 9   # 23-7
 WASTE_FRACTION = 0.3  # 30% waste when unoccupied
-DB_NAME="smarthome.db"
-
-
-def _parse_timestamp(ts_str):
-    """Parse timestamp string to datetime."""
-    try:
-        return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S.%f")
-    except ValueError:
-        return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-
-
-def _compute_kwh_from_logs(logs, power_kw):
-    """Compute total kWh from ON/OFF transition logs."""
-    total_hours = 0
-    last_on_time = None
-    for _, is_on, timestamp in logs:
-        ts = _parse_timestamp(timestamp)
-        if is_on == 1:
-            last_on_time = ts
-        elif is_on == 0 and last_on_time:
-            duration = ts - last_on_time
-            total_hours += duration.total_seconds() / 3600
-            last_on_time = None
-    return total_hours * power_kw
-
-
-def _normalize_appliance(name):
-    """Map DB appliance name to standard key for power rating."""
-    if not name:
-        return "AC"
-    n = str(name).upper()
-    if n == "AC":
-        return "AC"
-    if "LIGHT" in n:
-        return "Light"
-    return "AC"  # fallback
-
-
-def get_energy_by_room(db_name=DB_NAME):
-    """
-    Pull appliance data and compute total energy per room.
-    Returns list of dicts: [{"room_id": str, "AC": float, "Light": float, "total": float}, ...]
-    """
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT room_id FROM appliance_log ORDER BY room_id")
-    rooms = [r[0] for r in cursor.fetchall()]
-    cursor.execute("SELECT DISTINCT appliance FROM appliance_log")
-    appliances = [r[0] for r in cursor.fetchall()] or ["AC", "Light"]
-
-    result = []
-    for room_id in rooms:
-        row_data = {"room_id": room_id, "AC": 0, "Light": 0, "total": 0}
-        for appliance in appliances:
-            key = _normalize_appliance(appliance)
-            cursor.execute(
-                """
-                SELECT state, is_on, timestamp FROM appliance_log
-                WHERE room_id = ? AND appliance = ?
-                ORDER BY timestamp ASC
-                """,
-                (room_id, appliance),
-            )
-            logs = cursor.fetchall()
-            kwh = _compute_kwh_from_logs(logs, POWER_RATINGS.get(key, 0))
-            row_data[key] = round(row_data[key] + kwh, 4)
-        row_data["total"] = round(row_data["AC"] + row_data["Light"], 4)
-        result.append(row_data)
-    conn.close()
-    return result
+
+# Last dashboard payload per database, tagged with the data generation it was
+# built from; the least recently used entries go beyond DASHBOARD_CACHE_SIZE files
+DASHBOARD_CACHE_SIZE = 256
+_dashboard_cache = OrderedDict()
+_dashboard_cache_stats = {"hits": 0, "misses": 0}
+_dashboard_cache_lock = threading.Lock()
+
+# Tariff used for every cost figure; replace it with set_tariff()
+_tariff = Tariff.flat(TARIFF_NGN_PER_KWH, "Band A")
+
+
+# Every closed ON interval of every (room_id, appliance) pair, in a single scan of
+# appliance_log. An ON row opens an interval that the next row closes only if it
+# is an OFF (a repeated ON restarts the interval), which is exactly what the old
+# row-by-row loop in calculate_energy did.
+ON_INTERVALS_SQL = """
+    SELECT room_id, appliance, timestamp, next_ts
+    FROM (
+        SELECT room_id, appliance, is_on, timestamp,
+               LEAD(is_on) OVER w AS next_is_on,
+               LEAD(timestamp) OVER w AS next_ts
+        FROM appliance_log
+        WINDOW w AS (PARTITION BY room_id, appliance ORDER BY timestamp, id)
+    )
+    WHERE is_on = 1 AND next_is_on = 0
+"""
 
 
-def get_energy_by_appliance(db_name=DB_NAME):
+def get_tariff():
+    """The tariff.Tariff every cost figure is priced with."""
+    return _tariff
+
+
+def set_tariff(tariff):
+    """Prices every later cost figure with `tariff` (a tariff.Tariff)."""
+    global _tariff
+    with _dashboard_cache_lock:
+        _tariff = tariff
+        _dashboard_cache.clear()
+
+
+class _Intervals:
     """
-    Total energy per appliance type across all rooms.
-    Returns dict: {"AC": float, "Light": float, "total": float}
+    Closed ON intervals as arrays, with the energy of each one from the
+    appliance registry. Names are resolved once per distinct logged name and
+    energy is computed with one vectorized call per appliance type.
     """
-    by_room = get_energy_by_room(db_name)
-    result = {"AC": 0, "Light": 0, "total": 0}
+
+    def __init__(self, rows, rooms):
+        registry = appliances.get_registry()
+        self.rooms = list(rooms)
+        self.start = np.array([row[2] for row in rows], dtype=np.int64)
+        self.end = np.array([row[3] for row in rows], dtype=np.int64)
+        room_index = {room: i for i, room in enumerate(self.rooms)}
+        self.room_idx = np.array([room_index[row[0]] for row in rows], dtype=np.int64)
+
+        logged, logged_idx = np.unique(np.array([row[1] for row in rows], dtype=str), return_inverse=True)
+        resolved = [registry.get(name) for name in logged]
+        # Every registered type, in registry order (0 kWh without data); unknown names are reported apart
+        self.columns = registry.names
+        self.unrated = sorted({str(name) for name, appliance in zip(logged, resolved) if appliance is None})
+        column_index = {name: i for i, name in enumerate(self.columns)}
+        # Column of each row; -1 for unrated appliances
+        self.col_idx = np.array([column_index[a.name] if a is not None else -1 for a in resolved],
+                                dtype=np.int64)[logged_idx] if len(rows) else np.zeros(0, dtype=np.int64)
+
+        self.kwh = np.zeros(len(rows))
+        for col, name in enumerate(self.columns):
+            mask = self.col_idx == col
+            self.kwh[mask] = registry.types[name].energy_kwh_many(self.end[mask] - self.start[mask])
+
+
+@metrics.instrumented("analytics_load_intervals")
+def _load_intervals(db_name=None):
+    db.flush_pending_writes()
+    conn = db.get_connection(db_name)
+    rooms = [row[0] for row in conn.execute("SELECT DISTINCT room_id FROM appliance_log ORDER BY room_id")]
+    return _Intervals(conn.execute(ON_INTERVALS_SQL).fetchall(), rooms)
+
+
+def _energy_by_room_from_intervals(intervals):
+    """Per-room kWh dicts, one column per registered appliance type."""
+    n_cols = len(intervals.columns)
+    rated = intervals.col_idx >= 0
+    sums = np.bincount(intervals.room_idx[rated] * n_cols + intervals.col_idx[rated],
+                       weights=intervals.kwh[rated], minlength=len(intervals.rooms) * n_cols)
+    sums = sums.reshape(len(intervals.rooms), n_cols)
+    by_room = []
+    for room_id, room_sums in zip(intervals.rooms, sums):
+        row_data = {"room_id": room_id}
+        row_data.update({name: round(float(kwh), 4) for name, kwh in zip(intervals.columns, room_sums)})
+        row_data["total"] = round(sum(row_data[name] for name in intervals.columns), 4)
+        by_room.append(row_data)
+    return by_room
+
+
+def _energy_by_appliance_from_rooms(by_room, columns):
+    result = dict.fromkeys(columns, 0.0)
     for r in by_room:
-        result["AC"] += r["AC"]
-        result["Light"] += r["Light"]
-    result["AC"] = round(result["AC"], 4)
-    result["Light"] = round(result["Light"], 4)
-    result["total"] = round(result["AC"] + result["Light"], 4)
+        for name, kwh in r.items():
+            if name not in ("room_id", "total"):
+                result[name] = result.get(name, 0) + kwh
+    result = {name: round(kwh, 4) for name, kwh in result.items()}
+    result["total"] = round(sum(result.values()), 4)
     return result
 
 
-def get_daily_cost_ngn(db_name=DB_NAME):
-    """Daily cost estimate at ₦68/kWh (Band A tariff)."""
-    by_app = get_energy_by_appliance(db_name)
-    return round(by_app["total"] * TARIFF_NGN_PER_KWH, 2)
-
+@metrics.instrumented("analytics_cost_breakdown")
+def _cost_breakdown_from_intervals(intervals, tariff):
+    """Price the ON intervals under tariff, each at its average power."""
+    hours = (intervals.end - intervals.start) / db.MS_PER_HOUR
+    kw = np.divide(intervals.kwh, hours, out=np.zeros_like(intervals.kwh), where=hours > 0)
+    # Unrated appliances cost nothing; they are left out of the breakdown
+    return cost_breakdown([(intervals.rooms[room], intervals.columns[col], start, end, power)
+                           for room, col, start, end, power in zip(intervals.room_idx, intervals.col_idx,
+                                                                    intervals.start, intervals.end, kw)
+                           if col >= 0], tariff)
 
-def get_baseline_energy(db_name=DB_NAME):
-    """
-    Without SHEMS: appliances run during all occupied time + 30% waste when unoccupied.
-    Returns dict: {"AC": float, "Light": float, "total": float}
-    """
-    # Occupied: full usage. Unoccupied: 30% waste (left on)
-    # Per room × num_rooms (from DB)
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(DISTINCT room_id) FROM appliance_log")
-    num_rooms = cursor.fetchone()[0] or 4
-    conn.close()
 
+def _baseline_for_rooms(num_rooms):
     effective_hours = OCCUPIED_HOURS + (WASTE_FRACTION * UNOCCUPIED_HOURS)
-    ac_kwh_per_room = effective_hours * POWER_RATINGS["AC"]
-    light_kwh_per_room = effective_hours * POWER_RATINGS["Light"]
+    registry = appliances.get_registry()
+    ac_kwh_per_room = effective_hours * registry.rating("AC")
+    light_kwh_per_room = effective_hours * registry.rating("Light")
     return {
         "AC": round(ac_kwh_per_room * num_rooms, 4),
         "Light": round(light_kwh_per_room * num_rooms, 4),
@@ -128,14 +149,7 @@ def get_baseline_energy(db_name=DB_NAME):
     }
 
 
-def get_savings_comparison(db_name=DB_NAME):
-    """
-    Compare with SHEMS vs without SHEMS.
-    Returns dict with with_shems_kwh, without_shems_kwh, saved_kwh, savings_percent.
-    """
-    with_shems = get_energy_by_appliance(db_name)
-    without_shems = get_baseline_energy()
-
+def _savings_from_totals(with_shems, without_shems):
     with_kwh = with_shems["total"]
     without_kwh = without_shems["total"]
     saved = round(without_kwh - with_kwh, 4)
@@ -149,26 +163,155 @@ def get_savings_comparison(db_name=DB_NAME):
     }
 
 
-def get_db_statistics(db_name=DB_NAME):
+def get_energy_by_room(db_name=None):
+    """
+    Pull appliance data and compute total energy per room.
+    Returns list of dicts with one kWh column per registered appliance type:
+    [{"room_id": str, "AC": float, "Light": float, ..., "total": float}, ...]
+    """
+    return _energy_by_room_from_intervals(_load_intervals(db_name))
+
+
+def get_energy_by_appliance(db_name=None):
+    """
+    Total energy per appliance type across all rooms.
+    Returns dict: {"AC": float, "Light": float, ..., "total": float}
+    """
+    intervals = _load_intervals(db_name)
+    return _energy_by_appliance_from_rooms(_energy_by_room_from_intervals(intervals), intervals.columns)
+
+
+def get_cost_breakdown(db_name=None, tariff=None):
+    """
+    Cost of every closed ON interval under the time-of-use tariff (default:
+    the one set with set_tariff), split by band, room and appliance.
+    See tariff.cost_breakdown for the shape.
+    """
+    return _cost_breakdown_from_intervals(_load_intervals(db_name), tariff or _tariff)
+
+
+def get_daily_cost_ngn(db_name=None):
+    """Daily cost estimate under the current tariff (flat ₦68/kWh Band A by default)."""
+    return get_cost_breakdown(db_name)["total_ngn"]
+
+
+def get_baseline_energy(db_name=None):
+    """
+    Without SHEMS: appliances run during all occupied time + 30% waste when unoccupied.
+    Returns dict: {"AC": float, "Light": float, "total": float}
+    """
+    # Occupied: full usage. Unoccupied: 30% waste (left on)
+    # Per room × num_rooms (from DB)
+    db.flush_pending_writes()
+    conn = db.get_connection(db_name)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(DISTINCT room_id) FROM appliance_log")
+    num_rooms = cursor.fetchone()[0] or 4
+    return _baseline_for_rooms(num_rooms)
+
+
+def get_savings_comparison(db_name=None):
+    """
+    Compare with SHEMS vs without SHEMS.
+    Returns dict with with_shems_kwh, without_shems_kwh, saved_kwh, savings_percent.
+    """
+    return _savings_from_totals(get_energy_by_appliance(db_name), get_baseline_energy())
+
+
+@metrics.instrumented("analytics_db_stats")
+def get_db_statistics(db_name=None):
     """Readings logged, events recorded."""
-    conn = sqlite3.connect(db_name)
+    db.flush_pending_writes()
+    conn = db.get_connection(db_name)
     cursor = conn.cursor()
     stats = {}
     for table in ["sensor_log", "appliance_log", "energy_log"]:
         cursor.execute(f"SELECT COUNT(*) FROM {table}")
         stats[table] = cursor.fetchone()[0]
-    conn.close()
     return stats
 
 
-def get_dashboard_payload(db_name=DB_NAME):
+def get_sensor_summary(room_id=None, sensor_type="temperature", start_ms=None, end_ms=None):
+    """
+    count/mean/min/max of sensor readings over archived days and the live DB
+    together (see archive.read_sensor_log). Requires pyarrow.
+    """
+    import pyarrow.compute as pc
+    import archive
+
+    values = archive.read_sensor_log(room_id, sensor_type, start_ms, end_ms)["value"]
+    if len(values) == 0:
+        return {"count": 0, "mean": None, "min": None, "max": None}
+    min_max = pc.min_max(values)
+    return {
+        "count": len(values),
+        "mean": round(pc.mean(values).as_py(), 4),
+        "min": min_max["min"].as_py(),
+        "max": min_max["max"].as_py(),
+    }
+
+
+@metrics.instrumented("analytics_dashboard")
+def get_dashboard_payload(db_name=None, tariff=None):
     """
     Full JSON payload for the dashboard.
+    The ON intervals are read once (single scan of appliance_log) and every
+    energy and cost figure is built from them. Appliances missing from the
+    registry are listed under "unrated_appliances" and billed at 0 kW.
     """
+    intervals = _load_intervals(db_name)
+    by_room = _energy_by_room_from_intervals(intervals)
+    by_appliance = _energy_by_appliance_from_rooms(by_room, intervals.columns)
+    # Same room count get_baseline_energy() reads: distinct rooms in appliance_log
+    baseline = _baseline_for_rooms(len(by_room) or 4)
+    costs = _cost_breakdown_from_intervals(intervals, tariff or _tariff)
     return {
-        "energy_by_room": get_energy_by_room(db_name),
-        "energy_by_appliance": get_energy_by_appliance(db_name),
-        "daily_cost_ngn": get_daily_cost_ngn(db_name),
-        "savings": get_savings_comparison(db_name),
+        "energy_by_room": by_room,
+        "energy_by_appliance": by_appliance,
+        "unrated_appliances": intervals.unrated,
+        "daily_cost_ngn": costs["total_ngn"],
+        "cost_breakdown": costs,
+        "savings": _savings_from_totals(by_appliance, baseline),
         "db_stats": get_db_statistics(db_name),
     }
+
+
+def get_cached_dashboard_payload(db_name=None):
+    """
+    Dashboard payload, recomputed only when something has been written since the
+    last call (see database.get_generation). Writes made by other processes are
+    not tracked; use get_dashboard_payload() for those.
+    """
+    db_name = db_name or db.current_database()
+    # Rows still pending after the flush would be missing from the payload
+    flushed = db.flush_pending_writes()
+    generation = db.get_generation(db_name)
+    with _dashboard_cache_lock:
+        tariff = _tariff
+        cached = _dashboard_cache.get(db_name)
+        if cached is not None and cached[0] == generation and cached[1] is tariff:
+            _dashboard_cache_stats["hits"] += 1
+            _dashboard_cache.move_to_end(db_name)
+            return cached[2]
+        _dashboard_cache_stats["misses"] += 1
+
+    # The generation is read before computing, so a write that lands mid-way
+    # only makes the next call recompute
+    payload = get_dashboard_payload(db_name, tariff)
+    if not flushed:
+        return payload
+    with _dashboard_cache_lock:
+        _dashboard_cache[db_name] = (generation, tariff, payload)
+        _dashboard_cache.move_to_end(db_name)
+        while len(_dashboard_cache) > DASHBOARD_CACHE_SIZE:
+            _dashboard_cache.popitem(last=False)
+    return payload
+
+
+def get_dashboard_cache_stats():
+    """Hit/miss counters for get_cached_dashboard_payload, and the current database's generation."""
+    with _dashboard_cache_lock:
+        stats = dict(_dashboard_cache_stats)
+        stats["entries"] = len(_dashboard_cache)
+    stats["generation"] = db.get_generation()
+    return stats
@@ -1,7 +1,5 @@
 from flask import Flask, request, jsonify
-from database import DataLogger, calculate_energy
-import sqlite3
-from datetime import datetime
+from database import DataLogger, calculate_energy, record_appliance_event, now_ms
 
 app = Flask(__name__)
 logger = DataLogger()
@@ -19,14 +17,7 @@ def log_sensor():
 def log_appliance():
     data = request.json
     # Expected format: {"room_id": "Kitchen", "appliance": "lights", "state": "ON", "is_on": 1}
-    conn = sqlite3.connect('smarthome.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO appliance_log (room_id, appliance, state, is_on, timestamp)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (data['room_id'], data['appliance'], data['state'], data['is_on'], datetime.now()))
-    conn.commit()
-    conn.close()
+    record_appliance_event(data['room_id'], data['appliance'], data['state'], data['is_on'], now_ms())
     return jsonify({"status": "success", "message": "Appliance state logged"}), 201
 
 # 3. Endpoint to get energy report
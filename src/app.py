@@ -1,62 +1,254 @@
-from flask import Flask, jsonify, request
+"""
+SHEMS REST API.
+
+create_app() builds the Flask app from configuration (SHEMS_* environment
+variables, overridden by the config argument), so it runs the same under
+`python src/app.py` and multi-worker WSGI servers:
+
+    gunicorn -w 4 --chdir src 'app:create_app()'
+
+Startup does no database or simulation work: each home's shard, controllers
+and sensors are built on its first request (see homes.py), and the ingest
+writer thread starts on a worker's first request, after any pre-fork.
+Analytics, the tariff engine and NumPy are imported on first use.
+"""
+import atexit
+import json
+import os
+
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request
 import database as db
-import analytics
-from control import RoomController
-from sensors import RoomSensors
+import appliances
+import export
+import metrics
+from ingestion import IngestQueue, IngestQueueFull
+from homes import CHECKPOINT_STEPS, DEFAULT_HOME, HOMES_DIR, HomeRegistry
+from simulation import BASELINE_KWH_PER_ROOM_DAY, energy_analysis, load_rooms_config
+
+api = Blueprint("shems", __name__)
+# Process-wide endpoints: no home (nor its shard) is resolved for them
+HOMELESS_ENDPOINTS = frozenset({
+    "shems.get_home_stats", "shems.get_analytics_cache_stats", "shems.get_metrics",
+    "shems.tariff_schedule", "shems.get_appliance_registry", "shems.get_ingest_stats",
+})
+
+
+def _flag(value):
+    return value.lower() not in ("0", "false", "no")
+
+
+# Configuration keys, their defaults and how to parse them from the environment
+CONFIG_DEFAULTS = {
+    "SHEMS_DB": (None, str),                  # default home's SQLite file (default smarthome.db)
+    "SHEMS_HOMES_DIR": (HOMES_DIR, str),      # other homes' shard files
+    "SHEMS_ROOMS": (None, str),               # room count or JSON file, see simulation.load_rooms_config
+    "SHEMS_SEED": (None, int),                # reproducible sensors, see homes.HomeRegistry
+    "SHEMS_TARIFF": (None, str),              # JSON time-of-use schedule, see tariff.py
+    "SHEMS_MAX_HOMES": (1000, int),           # homes kept in memory per worker
+    "SHEMS_HOME_IDLE_SECONDS": (900.0, float),
+    "SHEMS_CHECKPOINT_STEPS": (CHECKPOINT_STEPS, int),  # steps between room state checkpoints
+    "SHEMS_SHARED_STATE": (False, _flag),     # several workers may serve one home, see homes.py
+    "SHEMS_INGEST": (True, _flag),            # ignored (off) with SHEMS_SHARED_STATE
+}
+
+# Steps per transaction and per progress line of a streamed /api/tick/batch
+TICK_STREAM_CHUNK = 288
+
+
+class _ShemsState:
+    """Per-app runtime state, kept in app.extensions["shems"]."""
+
+    def __init__(self, homes, ingest_enabled):
+        # Controllers and sensors of each home, built on first request and evicted when idle
+        self.homes = homes
+        self.ingest_enabled = ingest_enabled
+        self.ingest_queue = None
+        self.pid = None
+
+
+def _state():
+    return current_app.extensions["shems"]
+
 
-app = Flask(__name__)
+def _start_worker(state):
+    """Once per process: start the ingest writer (threads do not survive a pre-fork)."""
+    if state.pid == os.getpid():
+        return
+    state.pid = os.getpid()
+    if state.ingest_enabled:
+        # Ticks only enqueue rows; one writer thread commits them in coalesced transactions, per shard
+        state.ingest_queue = IngestQueue().start()
+        db.set_ingest_queue(state.ingest_queue)
+    # Registered after the ingest writer, so it runs (and enqueues) before the writer stops
+    atexit.register(state.homes.checkpoint_all)
 
-rooms = {} 
-sensors_dict = {}
 
-BASELINE_TOTAL = 146.88 # Adjusted for 4 rooms (36.72 * 4)
+def load_config(overrides=None):
+    """CONFIG_DEFAULTS, overridden by SHEMS_* environment variables, then by overrides."""
+    config = {}
+    for key, (default, parse) in CONFIG_DEFAULTS.items():
+        value = os.environ.get(key)
+        config[key] = parse(value) if value not in (None, "") else default
+    config.update(overrides or {})
+    return config
 
-@app.route('/api/energy', methods=['GET'])
+
+def create_app(config=None):
+    """Builds the SHEMS API app; config overrides SHEMS_* settings (see CONFIG_DEFAULTS)."""
+    app = Flask(__name__)
+    app.config.update(load_config(config))
+    if app.config["SHEMS_DB"]:
+        db.use_database(app.config["SHEMS_DB"])
+    if app.config["SHEMS_TARIFF"]:
+        import analytics
+        from tariff import Tariff
+        analytics.set_tariff(Tariff.from_json(app.config["SHEMS_TARIFF"]))
+
+    homes = HomeRegistry(homes_dir=app.config["SHEMS_HOMES_DIR"],
+                         rooms_config=load_rooms_config(app.config["SHEMS_ROOMS"]),
+                         seed=app.config["SHEMS_SEED"],
+                         max_active=app.config["SHEMS_MAX_HOMES"],
+                         idle_seconds=app.config["SHEMS_HOME_IDLE_SECONDS"],
+                         checkpoint_steps=app.config["SHEMS_CHECKPOINT_STEPS"],
+                         shared_state=app.config["SHEMS_SHARED_STATE"])
+    # Shared homes write in the tick's own transaction, not through the queue
+    ingest = app.config["SHEMS_INGEST"] and not app.config["SHEMS_SHARED_STATE"]
+    app.extensions["shems"] = _ShemsState(homes, ingest)
+    app.register_blueprint(api)
+    return app
+
+
+@api.before_request
+def _enter_home():
+    """
+    Routes the request to a home: ?home_id= or "home_id" in the JSON body
+    (default: the default home). Its shard is this thread's database, and the
+    home is held in use (never evicted), until teardown. HOMELESS_ENDPOINTS
+    get no home.
+    """
+    state = _state()
+    _start_worker(state)
+    if request.endpoint in HOMELESS_ENDPOINTS:
+        return None
+    body = request.get_json(silent=True) if request.is_json else None
+    if body is not None and not isinstance(body, dict):
+        return jsonify({"error": "JSON body must be an object"}), 400
+    home_id = request.args.get("home_id") or (body or {}).get("home_id") or DEFAULT_HOME
+    try:
+        g.home = state.homes.get(home_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    g.home_database = g.home.database()
+    g.home_database.__enter__()
+
+
+@api.teardown_request
+def _leave_home(exc):
+    home_database = g.pop("home_database", None)
+    if home_database is not None:
+        home_database.__exit__(None, None, None)
+    home = g.pop("home", None)
+    if home is not None:
+        _state().homes.release(home)
+
+
+def _streamed_in_home(chunks, **response_args):
+    """
+    Response streaming chunks against the request's home. The body is sent
+    after teardown, so the home stays in use until the response is closed.
+    """
+    home = g.home
+    homes = _state().homes
+    homes.acquire(home)
+
+    def generate():
+        with home.database():
+            yield from chunks
+    response = Response(generate(), **response_args)
+    response.call_on_close(lambda: homes.release(home))
+    return response
+
+
+@api.route('/api/homes', methods=['GET'])
+def get_home_stats():
+    """Active (in-memory) homes, loads and evictions of the home registry."""
+    return jsonify({"status": "success", "data": _state().homes.stats()}), 200
+
+
+@api.route('/api/energy', methods=['GET'])
 def get_energy_summary():
     try:
-        # 1. Clear old calculations to prevent duplicate math
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM energy_log")
-        conn.commit()
-        conn.close()
-
-        # 2. Run Afolabi's energy calculator for all 4 rooms
-        for room in ["Living Room", "Bedroom", "Kitchen", "Study"]:
-            db.calculate_energy(room, "AC")
-            db.calculate_energy(room, "Light")
-
-        # 3. Now fetch the freshly calculated totals!
-        energy_data = db.calculate_total_energy() 
+        # Running totals are maintained at every OFF transition, so this no
+        # longer rebuilds energy_log. ?as_of_step=N also counts appliances still ON at step N.
+        as_of_step = request.args.get("as_of_step", type=int)
+        as_of_ms = db.step_to_ms(as_of_step) if as_of_step is not None else None
+        energy_data = db.calculate_total_energy(as_of_ms)
         actual_total = energy_data.get("total_kwh", 0)
-        saved_kwh = BASELINE_TOTAL - actual_total
-        savings_percentage = (saved_kwh / BASELINE_TOTAL) * 100 if BASELINE_TOTAL > 0 else 0
-        
+
         return jsonify({
             "status": "success", 
             "data": energy_data,
-            "analysis": {
-                "baseline_kwh": BASELINE_TOTAL,
-                "actual_kwh": actual_total,
-                "saved_kwh": round(saved_kwh, 2),
-                "savings_percentage": round(savings_percentage, 1)
-            }
+            "analysis": energy_analysis(actual_total, BASELINE_KWH_PER_ROOM_DAY * len(g.home.controllers))
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/api/analytics', methods=['GET'])
+@api.route('/api/analytics', methods=['GET'])
 def get_analytics():
     """Energy analytics for dashboard: by room, by appliance, cost, savings, db stats."""
+    import analytics
     try:
-        payload = analytics.get_dashboard_payload()
+        payload = analytics.get_cached_dashboard_payload()
         return jsonify({"status": "success", "data": payload}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/api/tick', methods=['POST'])
+@api.route('/api/analytics/cache', methods=['GET'])
+def get_analytics_cache_stats():
+    """Hit/miss counters of the dashboard payload cache."""
+    import analytics
+    return jsonify({"status": "success", "data": analytics.get_dashboard_cache_stats()}), 200
+
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    This worker's stage latency histograms (with p50/p95/p99), row and SQL
+    statement counters and queue gauges, in the Prometheus text format.
+    """
+    state = _state()
+    gauges = {"homes_active": ("Homes held in memory by this worker", state.homes.stats()["active"])}
+    if state.ingest_queue is not None:
+        gauges["ingest_queue_depth"] = ("Rows waiting in the ingest queue", state.ingest_queue.stats()["depth"])
+    return Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
+@api.route('/api/tariff', methods=['GET', 'PUT'])
+def tariff_schedule():
+    """
+    GET: the time-of-use schedule costs are priced with.
+    PUT: replace it, e.g. {"name": "TOU", "bands": [{"name": "peak", "start_hour": 17,
+    "end_hour": 22, "rate": 95}, ...]}; the bands must cover the whole day.
+    """
+    import analytics
+    from tariff import Tariff
+    if request.method == 'PUT':
+        try:
+            analytics.set_tariff(Tariff.from_dict(request.get_json(force=True)))
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid tariff: {e}"}), 400
+    return jsonify({"status": "success", "data": analytics.get_tariff().to_dict()}), 200
+
+
+@api.route('/api/appliances', methods=['GET'])
+def get_appliance_registry():
+    """Registered appliance types: ratings, aliases and power curves."""
+    return jsonify({"status": "success", "data": appliances.get_registry().to_dict()}), 200
+
+
+@api.route('/api/tick', methods=['POST'])
 def advance_simulation():
     data = request.json
     step = data.get("step")
@@ -66,53 +258,167 @@ def advance_simulation():
         return jsonify({"error": "Missing 'step' or 'room_id' parameter"}), 400
 
     try:
-        # Convert step (5 min increments) to fractional hours for Ridwanullah's sensors
-        simulated_hour = step * 5 / 60.0
-
-        sensors_dict[room_id].read_all(simulated_hour)
-        ac_state, light_state = rooms[room_id].evaluate_state()
-
-        db.log_appliance_state(room_id, "AC", ac_state, ac_state == "COOLING", step)
-        db.log_appliance_state(room_id, "Light", light_state, light_state == "ON", step)
-
+        if room_id not in g.home.controllers:
+            return jsonify({"error": f"Unknown room: {room_id}"}), 400
+        g.home.tick(room_id, step)
         return jsonify({"status": "success"}), 200
 
+    except IngestQueueFull as e:
+        # Backpressure: rejected before the room advanced, so retrying the step is safe
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-# ... inside advance_simulation ...
 
-        # 1. Read sensors and decide state
-        sensors_dict[room_id].read_all(simulated_hour)
-        ac_state, light_state = rooms[room_id].evaluate_state()
+def _page_response(fetch_page, *series):
+    """
+    Runs a keyset page query from the common query string:
+    ?start_ms=&end_ms=&cursor=&limit=&order=asc|desc&format=rows|columnar
+    """
+    try:
+        page = fetch_page(*series,
+                          start_ms=request.args.get("start_ms", type=int),
+                          end_ms=request.args.get("end_ms", type=int),
+                          cursor=request.args.get("cursor"),
+                          limit=request.args.get("limit", 500, type=int),
+                          descending=request.args.get("order", "asc") == "desc")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if request.args.get("format") == "columnar":
+        data = db.page_to_columns(page)
+    else:
+        data = [dict(zip(page["columns"], row)) for row in page["rows"]]
+    return jsonify({"status": "success", "data": data, "next_cursor": page["next_cursor"]}), 200
+
+
+@api.route('/api/sensors/<room_id>/<sensor_type>/history', methods=['GET'])
+def get_sensor_history_page(room_id, sensor_type):
+    """
+    Raw sensor readings, keyset-paginated; follow next_cursor until it is null.
+    Reads SQLite only: days moved out by archive.py are not included.
+    """
+    return _page_response(db.get_sensor_page, room_id, sensor_type)
+
+
+@api.route('/api/appliances/<room_id>/<appliance>/events', methods=['GET'])
+def get_appliance_events(room_id, appliance):
+    """Appliance ON/OFF transitions, keyset-paginated; follow next_cursor until it is null."""
+    return _page_response(db.get_appliance_event_page, room_id, appliance)
+
+
+@api.route('/api/sensors/<room_id>/<sensor_type>/rollup', methods=['GET'])
+def get_sensor_rollup(room_id, sensor_type):
+    """Sensor min/max/avg/count per bucket. ?resolution=5m|1h|1d&start_ms=&end_ms= (epoch ms)."""
+    try:
+        buckets = db.get_sensor_rollup(room_id, sensor_type,
+                                       request.args.get("resolution", "1h"),
+                                       request.args.get("start_ms", type=int),
+                                       request.args.get("end_ms", type=int))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"status": "success", "data": buckets}), 200
+
+
+@api.route('/api/export/<export_name>', methods=['GET'])
+def export_log(export_name):
+    """
+    Streams sensor_log, appliance_log or energy (closed ON intervals) as
+    ?format=ndjson|csv, filtered by ?room_id=&start_ms=&end_ms=. sensor_log
+    covers the days not archived yet (see archive.py).
+    """
+    fmt = request.args.get("format", "ndjson")
+    if export_name not in export.EXPORTS or fmt not in export.FORMATS:
+        return jsonify({"error": f"Unknown export or format; exports: {sorted(export.EXPORTS)}, "
+                                 f"formats: {sorted(export.FORMATS)}"}), 400
+    chunks = export.iter_export(export_name, fmt,
+                                request.args.get("room_id"),
+                                request.args.get("start_ms", type=int),
+                                request.args.get("end_ms", type=int))
+    return _streamed_in_home(chunks, mimetype=export.FORMATS[fmt], headers={
+        "Content-Disposition": f"attachment; filename={export_name}.{fmt}"})
+
+
+@api.route('/api/ingest', methods=['GET'])
+def get_ingest_stats():
+    """Queue depth and write latency of the ingestion writer."""
+    ingest_queue = _state().ingest_queue
+    if ingest_queue is None:
+        return jsonify({"status": "success", "data": {"enabled": False}}), 200
+    return jsonify({"status": "success", "data": dict(ingest_queue.stats(), enabled=True)}), 200
+
+
+def _encode_states(step_results, room_ids):
+    """
+    Packs per-step (ac_state, light_state) tuples into code tables plus one
+    row of codes per step: {"codes": {"AC": [...], "Light": [...]}, "ac": [[...]], "light": [[...]]}.
+    """
+    codes = {"AC": [], "Light": []}
+    index = {"AC": {}, "Light": {}}
+    ac_rows, light_rows = [], []
+
+    def code(appliance, state):
+        if state not in index[appliance]:
+            index[appliance][state] = len(codes[appliance])
+            codes[appliance].append(state)
+        return index[appliance][state]
+
+    for _, states in step_results:
+        ac_rows.append([code("AC", ac) for ac, _ in states])
+        light_rows.append([code("Light", light) for _, light in states])
+    return {"rooms": room_ids, "codes": codes, "ac": ac_rows, "light": light_rows}
+
+
+@api.route('/api/tick/batch', methods=['POST'])
+def advance_simulation_batch():
+    """
+    Advances many rooms through a range of steps in one request.
+    Body: {"start_step": int, "end_step": int (exclusive), "rooms": [...] | "all", "stream": bool,
+           "home_id": str (optional)}
+    Steps run in order and, within a step, rooms run in the order given.
+    Without stream the whole range is one transaction and the response holds
+    the per-step states. With stream the range is committed every
+    TICK_STREAM_CHUNK steps and each chunk's states are sent as one NDJSON line
+    as soon as it is committed.
+    """
+    data = request.json or {}
+    start_step = data.get("start_step")
+    end_step = data.get("end_step")
+    requested = data.get("rooms", "all")
+
+    if not isinstance(start_step, int) or not isinstance(end_step, int) or end_step <= start_step:
+        return jsonify({"error": "'start_step' and 'end_step' must be integers with start_step < end_step"}), 400
+
+    home = g.home
+    room_ids = list(home.controllers) if requested == "all" else list(requested or [])
+    unknown = [room_id for room_id in room_ids if room_id not in home.controllers]
+    if not room_ids or unknown:
+        return jsonify({"error": f"Unknown or missing rooms: {unknown}"}), 400
+
+    if not data.get("stream"):
+        try:
+            results = home.tick_range(room_ids, range(start_step, end_step))
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        payload = _encode_states(results, room_ids)
+        payload.update({"start_step": start_step, "end_step": end_step})
+        return jsonify({"status": "success", "data": payload}), 200
 
-        # ---> PASTE THIS NEW LINE HERE <---
-        sensors_dict[room_id].temperature_sensor.set_ac_state(ac_state == "COOLING") 
+    def generate():
+        for chunk_start in range(start_step, end_step, TICK_STREAM_CHUNK):
+            chunk_end = min(chunk_start + TICK_STREAM_CHUNK, end_step)
+            try:
+                results = home.tick_range(room_ids, range(chunk_start, chunk_end))
+            except Exception as e:
+                # Earlier chunks stay committed; this one was rolled back
+                yield json.dumps({"error": str(e), "start_step": chunk_start}) + "\n"
+                return
+            payload = _encode_states(results, room_ids)
+            payload.update({"start_step": chunk_start, "end_step": chunk_end})
+            yield json.dumps(payload) + "\n"
+        yield json.dumps({"status": "success", "start_step": start_step, "end_step": end_step}) + "\n"
 
-        # 2. Log the results to the database
-        db.log_appliance_state(room_id, "AC", ac_state, ac_state == "COOLING", step)
-        db.log_appliance_state(room_id, "Light", light_state, light_state == "ON", step)
+    return _streamed_in_home(generate(), mimetype="application/x-ndjson")
 
-        # ... rest of function ...
 if __name__ == '__main__':
-    db.init_db()
-    
-    # Define the 4 rooms with their specific base temperatures
-    ROOMS_CONFIG = {
-        "Living Room": 25.0,
-        "Bedroom": 27.0,
-        "Kitchen": 30.0,
-        "Study": 28.0
-    }
-    
-    from database import DataLogger
-    logger = DataLogger()
-
-    for room_name, base_temp in ROOMS_CONFIG.items():
-        rooms[room_name] = RoomController(room_name)
-        sensors_dict[room_name] = RoomSensors(room_name, base_temp=base_temp)
-        
-        # Using Ridwanullah's exact method name
-        sensors_dict[room_name].register_observer(rooms[room_name]) 
-        sensors_dict[room_name].register_observer(logger)          
-    
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # Settings come from SHEMS_* environment variables, e.g. SHEMS_SEED=42 makes
+    # the default home reproducible against `python src/run_24h_sim.py --seed 42`
+    create_app().run(debug=True, port=5000)
@@ -0,0 +1,170 @@
+"""
+Appliance registry for SHEMS.
+
+One entry per appliance type: its power rating, optional variable-power
+curve and the other names it is logged under. Every energy path (database
+running totals, energy_log, analytics) resolves appliance names here, so a
+fridge logged as "fridge" is billed as a Fridge and an unknown name is
+billed at 0 kW and reported, never silently priced as an AC.
+
+Lookups are one dict probe: names and aliases are indexed case-insensitively
+up front, and every spelling seen is cached as-is, so it is normalised only
+the first time it is looked up.
+
+The registry is loaded once at import: the built-in AC and Light, or the JSON
+file named by SHEMS_APPLIANCES:
+    {"appliances": [
+        {"name": "AC", "rating_kw": 1.5, "aliases": ["A/C", "Air Conditioner"],
+         "curve": [[0, 2.2], [10, 1.5]]},
+        {"name": "Fridge", "rating_kw": 0.15, "aliases": ["Refrigerator"]}]}
+
+A curve is [[minutes since switch-on, kW], ...]: the appliance draws each kW
+from that minute until the next point (e.g. a compressor's start-up surge),
+and the last kW for the rest of the interval. Without a curve it draws
+rating_kw throughout.
+"""
+import bisect
+import json
+import os
+
+MS_PER_HOUR = 3_600_000
+MS_PER_MINUTE = 60_000
+
+
+class ApplianceType:
+    """An appliance type: canonical name, rating (kW), aliases and optional power curve."""
+
+    def __init__(self, name, rating_kw, aliases=(), curve=None):
+        self.name = name
+        self.rating_kw = float(rating_kw)
+        self.aliases = tuple(aliases)
+        self.curve = [(float(minute), float(kw)) for minute, kw in curve] if curve else None
+        if self.curve:
+            minutes = [minute for minute, _ in self.curve]
+            if minutes[0] != 0 or any(a >= b for a, b in zip(minutes, minutes[1:])):
+                raise ValueError(f"{name}: curve minutes must start at 0 and increase")
+            self._breaks_ms = [minute * MS_PER_MINUTE for minute in minutes]
+            self._kw = [kw for _, kw in self.curve]
+            # kWh drawn from switch-on up to each break point
+            self._kwh_at_break = [0.0]
+            for i in range(1, len(self._breaks_ms)):
+                self._kwh_at_break.append(self._kwh_at_break[-1] + (self._breaks_ms[i] - self._breaks_ms[i - 1])
+                                          * self._kw[i - 1] / MS_PER_HOUR)
+
+    def energy_kwh(self, duration_ms):
+        """kWh of one ON interval lasting duration_ms."""
+        duration_ms = max(duration_ms, 0)
+        if not self.curve:
+            return duration_ms / MS_PER_HOUR * self.rating_kw
+        segment = bisect.bisect_right(self._breaks_ms, duration_ms) - 1
+        return self._kwh_at_break[segment] + (duration_ms - self._breaks_ms[segment]) * self._kw[segment] / MS_PER_HOUR
+
+    def energy_kwh_many(self, durations_ms):
+        """kWh of each ON interval in an array of durations (ms), as a NumPy array."""
+        import numpy as np  # only the vectorized analytics path needs NumPy
+
+        durations_ms = np.maximum(np.asarray(durations_ms, dtype=float), 0)
+        if not self.curve:
+            return durations_ms / MS_PER_HOUR * self.rating_kw
+        breaks_ms = np.array(self._breaks_ms)
+        segment = np.searchsorted(breaks_ms, durations_ms, side="right") - 1
+        return (np.array(self._kwh_at_break)[segment]
+                + (durations_ms - breaks_ms[segment]) * np.array(self._kw)[segment] / MS_PER_HOUR)
+
+    def to_dict(self):
+        entry = {"name": self.name, "rating_kw": self.rating_kw, "aliases": list(self.aliases)}
+        if self.curve:
+            entry["curve"] = [list(point) for point in self.curve]
+        return entry
+
+
+class ApplianceRegistry:
+    """Appliance types by canonical name and alias."""
+
+    def __init__(self, types=()):
+        self.types = {}
+        self._index = {}  # casefolded name or alias -> ApplianceType
+        self._cache = {}  # exact spelling seen -> ApplianceType
+        for appliance in types:
+            self.register(appliance)
+
+    def register(self, appliance):
+        keys = [name.strip().casefold() for name in (appliance.name, *appliance.aliases)]
+        for name, key in zip((appliance.name, *appliance.aliases), keys):
+            owner = self._index.get(key)
+            if owner is not None and owner.name != appliance.name:
+                raise ValueError(f"{name!r} already names {owner.name}")
+        self.types[appliance.name] = appliance
+        for key in keys:
+            self._index[key] = appliance
+        self._cache = {appliance.name: appliance for appliance in self.types.values()}
+
+    def get(self, name):
+        """The ApplianceType logged as `name`, or None if it is not registered."""
+        appliance = self._cache.get(name)
+        if appliance is None and isinstance(name, str):
+            appliance = self._index.get(name.strip().casefold())
+            if appliance is not None:
+                self._cache[name] = appliance
+        return appliance
+
+    def canonical(self, name):
+        """Registered name for `name`; unknown names are returned unchanged."""
+        appliance = self.get(name)
+        return appliance.name if appliance is not None else name
+
+    def rating(self, name):
+        """Rated power in kW (0 for unknown appliances)."""
+        appliance = self.get(name)
+        return appliance.rating_kw if appliance is not None else 0.0
+
+    def energy_kwh(self, name, duration_ms):
+        """kWh of one ON interval (0 for unknown appliances)."""
+        appliance = self.get(name)
+        return appliance.energy_kwh(duration_ms) if appliance is not None else 0.0
+
+    @property
+    def names(self):
+        return list(self.types)
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(ApplianceType(entry["name"], entry["rating_kw"], entry.get("aliases", ()), entry.get("curve"))
+                   for entry in config["appliances"])
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        return {"appliances": [appliance.to_dict() for appliance in self.types.values()]}
+
+
+DEFAULT_APPLIANCES = (
+    ApplianceType("AC", 1.5, aliases=("A/C", "Air Conditioner", "Aircon")),
+    ApplianceType("Light", 0.06, aliases=("Lights", "Lighting", "Lamp")),
+)
+
+
+def load_registry(path=None):
+    """Registry from `path`, else from the SHEMS_APPLIANCES file, else the built-in types."""
+    path = path or os.environ.get("SHEMS_APPLIANCES")
+    return ApplianceRegistry.from_json(path) if path else ApplianceRegistry(DEFAULT_APPLIANCES)
+
+
+REGISTRY = load_registry()
+
+
+def get_registry():
+    return REGISTRY
+
+
+def set_registry(registry):
+    """
+    Replaces the registry. Meant for startup: running totals already held by
+    database are kept, so call database.warm_state_cache() afterwards if
+    energy has been computed before.
+    """
+    global REGISTRY
+    REGISTRY = registry
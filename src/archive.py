@@ -0,0 +1,251 @@
+"""
+Columnar archive tier for sensor_log.
+
+Closed simulated days (every day before the one holding the newest reading)
+are moved out of SQLite into zstd-compressed Parquet files, one per shard,
+day and room:
+
+    archive/shard=smarthome.db/sensor_log/day=2026-02-18/room=Living%20Room.parquet
+
+The shard is the database file archived (a home's shard, see homes.py), so
+homes with the same room names never share files. Each file holds
+sensor_type (dictionary-encoded), value and timestamp; the room is the
+partition. Once all of a day's files are written they are swapped into
+place and the day's rows are deleted from sensor_log in one transaction.
+Each file records the newest sensor_log id it holds, so a run interrupted
+between the two steps can simply be repeated. database.reset_db() deletes
+the shard's archive along with its logs. sensor_rollup is left untouched,
+so rollup history still spans the archived days.
+read_sensor_log() memory-maps the archived files and appends the matching
+live rows, so callers see one continuous table. The raw history and export
+endpoints (/api/sensors/.../history, /api/export/sensor_log) read SQLite
+only and cover the days not archived yet.
+
+Run it periodically (e.g. from cron):
+    python src/archive.py                 # archive every closed day
+    python src/archive.py --keep-days 7 --vacuum
+    python src/archive.py --db homes/h1.db
+"""
+import argparse
+import os
+import shutil
+import urllib.parse
+from datetime import datetime
+
+import database as db
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = pc = pq = None
+
+ARCHIVE_DIR = "archive"
+MS_PER_DAY = 24 * db.MS_PER_HOUR
+COMPRESSION = "zstd"
+# Parquet metadata key: the newest sensor_log id a file holds
+ARCHIVED_ID = b"shems_archived_id"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("pyarrow not installed. Run: pip install pyarrow")
+
+
+def _shard_dir(archive_dir, path=None):
+    """Archive directory of the database file path (default: this thread's current one)."""
+    path = os.path.normpath(path or db.current_database())
+    return os.path.join(archive_dir, f"shard={urllib.parse.quote(path, safe='')}")
+
+
+def clear_archive(archive_dir=ARCHIVE_DIR, path=None):
+    """Deletes the archive of the database file path (default: this thread's current one)."""
+    shutil.rmtree(_shard_dir(archive_dir, path), ignore_errors=True)
+
+
+def _day_dir(archive_dir, day_ms):
+    return os.path.join(_shard_dir(archive_dir), "sensor_log", f"day={db.from_epoch_ms(day_ms):%Y-%m-%d}")
+
+
+def _room_file(day_dir, room_id):
+    return os.path.join(day_dir, f"room={urllib.parse.quote(room_id, safe='')}.parquet")
+
+
+def _schema():
+    return pa.schema([
+        ("sensor_type", pa.dictionary(pa.int8(), pa.string())),
+        ("value", pa.float64()),
+        ("timestamp", pa.int64()),
+    ])
+
+
+def archive_closed_days(archive_dir=ARCHIVE_DIR, keep_days=0):
+    """
+    Moves every day of the current database's sensor_log older than the newest
+    reading's day (minus keep_days more days) into its shard's archive.
+    Returns the archived day starts (epoch ms).
+    """
+    _require_pyarrow()
+    db.flush_pending_writes()
+    conn = db.get_connection()
+    newest = conn.execute("SELECT MAX(timestamp) FROM sensor_log").fetchone()[0]
+    if newest is None:
+        return []
+    cutoff = newest - newest % MS_PER_DAY - keep_days * MS_PER_DAY
+    days = [row[0] for row in conn.execute(
+        f"SELECT DISTINCT (timestamp / {MS_PER_DAY}) * {MS_PER_DAY} FROM sensor_log WHERE timestamp < ? ORDER BY 1",
+        (cutoff,))]
+
+    for day in days:
+        _archive_day(conn, archive_dir, day)
+    if days:
+        db.bump_generation()
+    return days
+
+
+def _archive_day(conn, archive_dir, day):
+    day_dir = _day_dir(archive_dir, day)
+    os.makedirs(day_dir, exist_ok=True)
+    # Rows up to last_id are this pass's; later ones wait for the next pass
+    last_id, = conn.execute(
+        "SELECT MAX(id) FROM sensor_log WHERE timestamp >= ? AND timestamp < ?", (day, day + MS_PER_DAY)).fetchone()
+    rooms = [row[0] for row in conn.execute(
+        "SELECT DISTINCT room_id FROM sensor_log WHERE timestamp >= ? AND timestamp < ? AND id <= ?",
+        (day, day + MS_PER_DAY, last_id))]
+
+    # Write everything to temporary names first; only then replace and delete
+    staged = []
+    for room_id in rooms:
+        path = _room_file(day_dir, room_id)
+        old_table = pq.read_table(path) if os.path.exists(path) else None
+        # Each file records the newest id it holds: the rows of a pass interrupted
+        # before its DELETE are in the file already and must not be appended again
+        archived_id = int((old_table.schema.metadata or {}).get(ARCHIVED_ID, 0)) if old_table is not None else 0
+        rows = conn.execute('''
+            SELECT sensor_type, value, timestamp FROM sensor_log
+            WHERE room_id = ? AND timestamp >= ? AND timestamp < ? AND id > ? AND id <= ?
+            ORDER BY timestamp, id
+        ''', (room_id, day, day + MS_PER_DAY, archived_id, last_id)).fetchall()
+        if not rows:
+            continue
+        new_table = pa.table({
+            "sensor_type": pa.array([r[0] for r in rows]).dictionary_encode(),
+            "value": pa.array([r[1] for r in rows], pa.float64()),
+            "timestamp": pa.array([r[2] for r in rows], pa.int64()),
+        }).cast(_schema())
+        if old_table is not None:
+            # A day can be archived in more than one pass (late readings)
+            new_table = pa.concat_tables([old_table.cast(_schema()), new_table])
+        new_table = new_table.replace_schema_metadata({ARCHIVED_ID: str(last_id)})
+        pq.write_table(new_table, path + ".tmp", compression=COMPRESSION)
+        staged.append(path)
+
+    for path in staged:
+        os.replace(path + ".tmp", path)
+    with conn:
+        conn.execute("DELETE FROM sensor_log WHERE timestamp >= ? AND timestamp < ? AND id <= ?",
+                     (day, day + MS_PER_DAY, last_id))
+
+
+def _archived_files(archive_dir, room_id, start_ms, end_ms):
+    root = os.path.join(_shard_dir(archive_dir), "sensor_log")
+    if not os.path.isdir(root):
+        return []
+    first_day = None if start_ms is None else start_ms - start_ms % MS_PER_DAY
+    files = []
+    for name in sorted(os.listdir(root)):
+        day = db.to_epoch_ms(datetime.strptime(name[len("day="):], "%Y-%m-%d"))
+        if (first_day is not None and day < first_day) or (end_ms is not None and day >= end_ms):
+            continue
+        day_dir = os.path.join(root, name)
+        if room_id is not None:
+            path = _room_file(day_dir, room_id)
+            if os.path.exists(path):
+                files.append((room_id, path))
+        else:
+            for file_name in sorted(os.listdir(day_dir)):
+                if file_name.endswith(".parquet"):
+                    room = urllib.parse.unquote(file_name[len("room="):-len(".parquet")])
+                    files.append((room, os.path.join(day_dir, file_name)))
+    return files
+
+
+def read_sensor_log(room_id=None, sensor_type=None, start_ms=None, end_ms=None, archive_dir=ARCHIVE_DIR):
+    """
+    sensor_log rows of the current database, from its shard's archive
+    (memory-mapped) followed by the live DB, as a pyarrow Table with columns room_id, sensor_type, value, timestamp,
+    filtered by room, sensor type and [start_ms, end_ms).
+    """
+    _require_pyarrow()
+    parts = []
+    for room, path in _archived_files(archive_dir, room_id, start_ms, end_ms):
+        table = pq.read_table(path, memory_map=True)
+        mask = None
+        if sensor_type is not None:
+            mask = pc.equal(table["sensor_type"].cast(pa.string()), sensor_type)
+        if start_ms is not None:
+            mask = _and(mask, pc.greater_equal(table["timestamp"], start_ms))
+        if end_ms is not None:
+            mask = _and(mask, pc.less(table["timestamp"], end_ms))
+        if mask is not None:
+            table = table.filter(mask)
+        parts.append(pa.table({
+            "room_id": pa.array([room] * table.num_rows, pa.string()),
+            "sensor_type": table["sensor_type"].cast(pa.string()),
+            "value": table["value"],
+            "timestamp": table["timestamp"],
+        }))
+
+    where, params = [], []
+    for column, value in (("room_id", room_id), ("sensor_type", sensor_type)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if start_ms is not None:
+        where.append("timestamp >= ?")
+        params.append(start_ms)
+    if end_ms is not None:
+        where.append("timestamp < ?")
+        params.append(end_ms)
+    db.flush_pending_writes()
+    rows = db.get_connection().execute(
+        "SELECT room_id, sensor_type, value, timestamp FROM sensor_log"
+        + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY timestamp, id", params).fetchall()
+    parts.append(pa.table({
+        "room_id": pa.array([r[0] for r in rows], pa.string()),
+        "sensor_type": pa.array([r[1] for r in rows], pa.string()),
+        "value": pa.array([r[2] for r in rows], pa.float64()),
+        "timestamp": pa.array([r[3] for r in rows], pa.int64()),
+    }))
+    return pa.concat_tables(parts)
+
+
+def _and(mask, other):
+    return other if mask is None else pc.and_(mask, other)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=db.DB_NAME, help="database file to archive (e.g. a home's shard)")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--keep-days", type=int, default=0,
+                        help="closed days to keep in SQLite as well as the current one")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the database file")
+    args = parser.parse_args()
+
+    with db.using_database(args.db):
+        days = archive_closed_days(args.archive_dir, args.keep_days)
+        for day in days:
+            print(f"Archived {db.from_epoch_ms(day):%Y-%m-%d}")
+        if not days:
+            print("Nothing to archive.")
+        if args.vacuum:
+            conn = db.get_connection()
+            conn.execute("VACUUM")
+            # In WAL mode the smaller file only lands in the main database at a checkpoint
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+if __name__ == "__main__":
+    main()
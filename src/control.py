@@ -1,4 +1,5 @@
 from typing import Dict, Any
+import metrics
 from sensors import SensorObserver
 
 class ACController:
@@ -47,6 +48,7 @@ class RoomController(SensorObserver):
         elif stype == 'ldr':
             self.current_light_level = sensor_data['value']
 
+    @metrics.instrumented("fsm_evaluate", metrics.SAMPLE_EVERY)
     def evaluate_state(self) -> tuple:
         """Processes current sensor readings through FSMs and returns new states."""
         if self.manual_ac_override:
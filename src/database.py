@@ -1,12 +1,228 @@
+import atexit
+import base64
+import json
+import os
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
+import appliances
+import metrics
+import migrations
+
+# SQLite file every reader and writer uses by default; see use_database()
+DB_NAME = 'smarthome.db'
+
+# Per-thread override of DB_NAME, set by using_database() (e.g. one shard file per home)
+_current = threading.local()
+
+def current_database():
+    """The file this thread reads and writes by default: the using_database() one, else DB_NAME."""
+    return getattr(_current, "path", None) or DB_NAME
+
+@contextmanager
+def using_database(path):
+    """Routes this thread's default reads and writes to path inside the block."""
+    previous = getattr(_current, "path", None)
+    _current.path = path
+    try:
+        yield
+    finally:
+        _current.path = previous
+
+# Connection layer: each thread keeps one connection per database file, opened
+# on first use with the pragmas below and reused until the thread exits. WAL lets
+# readers run while a writer commits, and busy_timeout makes a second writer wait
+# for the lock instead of failing with "database is locked". A thread keeps at
+# most MAX_POOLED_CONNECTIONS open, closing the least recently used one beyond
+# that, so serving many shard files does not pile up file handles.
+BUSY_TIMEOUT_MS = 5000
+MAX_POOLED_CONNECTIONS = 32
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",  # 16 MB page cache
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+)
+_pool = threading.local()
+
+class _Cursor(sqlite3.Cursor):
+    """Cursor counting its statements in metrics."""
+    def execute(self, sql, parameters=()):
+        metrics.count_statement(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        metrics.count_statement(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+class _Connection(sqlite3.Connection):
+    """Connection counting its statements in metrics (Connection.execute bypasses cursor())."""
+    def cursor(self, factory=_Cursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        metrics.count_statement(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        metrics.count_statement(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+def connect(path=None, **kwargs):
+    """Opens a new, unpooled connection with the standard pragmas; the caller closes it."""
+    kwargs.setdefault("factory", _Connection)
+    conn = sqlite3.connect(path or current_database(), timeout=BUSY_TIMEOUT_MS / 1000, **kwargs)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_connection(path=None):
+    """
+    This thread's pooled connection to path (default current_database()).
+    Callers must not close it; commit or roll back instead, or use `with conn:`.
+    """
+    path = path or current_database()
+    if getattr(_pool, "pid", None) != os.getpid():
+        # Never reuse a connection inherited across fork (e.g. by a process pool)
+        _pool.pid = os.getpid()
+        _pool.connections = OrderedDict()
+    conn = _pool.connections.get(path)
+    if conn is None:
+        conn = _pool.connections[path] = connect(path)
+        if len(_pool.connections) > MAX_POOLED_CONNECTIONS:
+            for idle_path, idle in list(_pool.connections.items()):
+                if idle_path != path and not idle.in_transaction:
+                    del _pool.connections[idle_path]
+                    idle.close()
+                    break
+    else:
+        _pool.connections.move_to_end(path)
+    return conn
+
+def close_connections():
+    """Closes this thread's pooled connections (e.g. before deleting a scratch database)."""
+    if getattr(_pool, "pid", None) == os.getpid():
+        for conn in _pool.connections.values():
+            conn.close()
+    _pool.pid = os.getpid()
+    _pool.connections = OrderedDict()
+
 # Fixed simulated start date for consistent, repeatable testing
 SIMULATION_START = datetime(2026, 2, 18, 0, 0, 0)
 
+# Timestamps are stored as integer milliseconds since 1970-01-01 (naive datetimes
+# are treated as UTC), so readers compare and subtract them without any parsing.
+# One simulation step is exactly 5 minutes, so ms_to_step() recovers step numbers.
+EPOCH = datetime(1970, 1, 1)
+MS_PER_HOUR = 3_600_000
+MS_PER_STEP = 5 * 60 * 1000
+
+def to_epoch_ms(dt):
+    """Converts a naive datetime to integer epoch milliseconds."""
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+def from_epoch_ms(ms):
+    """Converts integer epoch milliseconds back to a naive datetime."""
+    return EPOCH + timedelta(milliseconds=ms)
+
+SIMULATION_START_MS = to_epoch_ms(SIMULATION_START)
+
+def step_to_ms(step):
+    """Timestamp of a simulation step (1 step = 5 minutes)."""
+    return SIMULATION_START_MS + step * MS_PER_STEP
+
+def hour_to_ms(simulated_hour):
+    """Timestamp of a fractional simulated hour."""
+    return SIMULATION_START_MS + round(simulated_hour * MS_PER_HOUR)
+
+def ms_to_step(ms):
+    """Simulation step of a timestamp written by step_to_ms()."""
+    return (ms - SIMULATION_START_MS) // MS_PER_STEP
+
+def now_ms():
+    """Current wall-clock time as epoch milliseconds, for real (non-simulated) events."""
+    return to_epoch_ms(datetime.now())
+
+# Anything that holds rows in memory (e.g. a buffered DataLogger) registers a
+# flush callback here, so readers can push pending data to disk before querying.
+_flush_hooks = []
+
+def register_flush_hook(hook):
+    """Registers a callable that writes out buffered rows when invoked."""
+    if hook not in _flush_hooks:
+        _flush_hooks.append(hook)
+
+def unregister_flush_hook(hook):
+    if hook in _flush_hooks:
+        _flush_hooks.remove(hook)
+
+def flush_pending_writes():
+    """
+    Writes all buffered rows to disk so queries never read stale data.
+    Returns False if a hook had to leave rows pending (e.g. behind an open
+    appliance_write_batch()); results read then must not be cached.
+    """
+    flushed = True
+    for hook in list(_flush_hooks):
+        if hook() is False:
+            flushed = False
+    return flushed
+
+# Data generation per database file: bumped by every writer in this process
+# (log_appliance_state, DataLogger, calculate_energy, reset_db). Readers that
+# cache results compare generations to know whether anything has been written
+# since they computed them. Values come from one process-wide counter, so a
+# file's generation never repeats.
+_generations = {}
+_generation_counter = 0
+_generation_lock = threading.Lock()
+
+def bump_generation(path=None):
+    global _generation_counter
+    with _generation_lock:
+        _generation_counter += 1
+        _generations[path or current_database()] = _generation_counter
+
+def get_generation(path=None):
+    return _generations.get(path or current_database(), 0)
+
+# Optional asynchronous writer (see ingestion.IngestQueue). While one is set,
+# appliance events and unbuffered DataLogger readings are enqueued instead of
+# written on the caller's thread. A queue with db_name None serves every file.
+_ingest_queue = None
+
+def set_ingest_queue(ingest_queue):
+    """Routes writes through ingest_queue (None to write synchronously again)."""
+    global _ingest_queue
+    flush_pending_writes()
+    _ingest_queue = ingest_queue
+
+def _ingest_for(path):
+    """The ingest queue, if one is set and writes to path."""
+    if _ingest_queue is not None and _ingest_queue.db_name in (None, path):
+        return _ingest_queue
+    return None
+
+@contextmanager
+def reserve_ingest(rows):
+    """
+    Holds room on the current database's ingest queue (if any) for `rows` rows
+    logged inside the block; raises IngestQueueFull before it runs otherwise.
+    """
+    ingest = _ingest_for(current_database())
+    if ingest is None:
+        yield
+        return
+    with ingest.reserve(rows):
+        yield
+
 def init_db():
     """Initializes the SQLite database and creates tables."""
-    conn = sqlite3.connect('smarthome.db')
+    conn = get_connection()
     cursor = conn.cursor()
 
     # 1. sensor_log: Raw data from sensors
@@ -45,15 +261,96 @@ def init_db():
     ''')
 
     conn.commit()
-    conn.close()
+
+    # 4. Indexes and later schema changes, applied in place to existing files
+    migrations.migrate(conn)
+    warm_state_cache()
     print("Database initialized successfully.")
 
+# Row inserts by table kind, shared with the ingestion writer
+INSERT_SQL = {
+    "sensor": '''INSERT INTO sensor_log (room_id, sensor_type, value, timestamp)
+                 VALUES (?, ?, ?, ?)''',
+    "appliance": '''INSERT INTO appliance_log (room_id, appliance, state, is_on, timestamp)
+                    VALUES (?, ?, ?, ?, ?)''',
+    "energy": '''INSERT INTO energy_log (room_id, appliance, kwh, period_start, period_end)
+                 VALUES (?, ?, ?, ?, ?)''',
+    # Checkpoints replace the room's previous one (see room_state.py)
+    "room_state": '''INSERT OR REPLACE INTO room_state (room_id, version, step, state, rng)
+                      VALUES (?, ?, ?, ?, ?)''',
+}
+INSERT_TABLES = {"sensor": "sensor_log", "appliance": "appliance_log", "energy": "energy_log",
+                 "room_state": "room_state"}
+
+def write_rows(conn, kind, rows):
+    """Inserts rows of table `kind` (see INSERT_SQL) in the caller's transaction."""
+    conn.executemany(INSERT_SQL[kind], rows)
+    metrics.count("rows_written", len(rows), INSERT_TABLES[kind])
+
+# sensor_rollup resolutions (bucket widths in ms), see migration 4
+ROLLUP_RESOLUTIONS = {"5m": MS_PER_STEP, "1h": MS_PER_HOUR, "1d": 24 * MS_PER_HOUR}
+
+_ROLLUP_UPSERT = '''
+    INSERT INTO sensor_rollup (bucket_ms, room_id, sensor_type, bucket_start, count, sum, min, max)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (bucket_ms, room_id, sensor_type, bucket_start) DO UPDATE SET
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max)
+'''
+
+def insert_sensor_rows(conn, rows):
+    """
+    Inserts (room_id, sensor_type, value, timestamp) rows and folds them into
+    sensor_rollup at every resolution, in the caller's transaction (the
+    caller commits). Rows are pre-aggregated per bucket, so each batch costs
+    one upsert per touched bucket, not one per reading.
+    """
+    write_rows(conn, "sensor", rows)
+    buckets = {}
+    for room_id, sensor_type, value, timestamp in rows:
+        for bucket_ms in ROLLUP_RESOLUTIONS.values():
+            key = (bucket_ms, room_id, sensor_type, timestamp - timestamp % bucket_ms)
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = [1, value, value, value]
+            else:
+                agg[0] += 1
+                agg[1] += value
+                agg[2] = min(agg[2], value)
+                agg[3] = max(agg[3], value)
+    conn.executemany(_ROLLUP_UPSERT, [key + tuple(agg) for key, agg in buckets.items()])
+    metrics.count("rows_written", len(buckets), "sensor_rollup")
+
 class DataLogger:
-    """Observer class that logs sensor data from Ridwanullah's dict-based notifications."""
-    def __init__(self, db_name='smarthome.db'):
-        self.db_name = db_name
+    """
+    Observer class that logs sensor data from Ridwanullah's dict-based notifications.
 
-    def update(self, data: dict):
+    By default every reading is inserted and committed straight away (or
+    enqueued, with an ingest queue set); inside this thread's
+    appliance_write_batch() it is written in the batch's transaction. With
+    buffered=True the logger queues readings in memory and writes them with
+    executemany in a single transaction once batch_size readings are queued
+    or flush_interval seconds have passed since the last flush.
+    Buffered readings are also flushed at interpreter shutdown and whenever
+    flush_pending_writes() is called ahead of a query. While an
+    appliance_write_batch() is open, flushes are deferred (the batch holds
+    SQLite's write lock) and the readings stay queued.
+    """
+    def __init__(self, db_name=None, buffered=False, batch_size=500, flush_interval=2.0):
+        self.db_name = db_name or current_database()
+        self.buffered = buffered
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        if buffered:
+            register_flush_hook(self.flush)
+            atexit.register(self.close)
+
+    def _to_row(self, data: dict):
         # Ridwanullah uses 'room' and 'hour' in his dictionary
         room_id = data.get('room', 'Unknown')
         sensor_type = data.get('sensor_type', 'Unknown')
@@ -61,143 +358,525 @@ class DataLogger:
         simulated_hour = data.get('hour', 0) 
         
         # Calculate fixed timestamp based on the simulated hour
-        sim_time = SIMULATION_START + timedelta(hours=simulated_hour)
-        timestamp_str = sim_time.strftime('%Y-%m-%d %H:%M:%S.%f')
-        
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO sensor_log (room_id, sensor_type, value, timestamp)
-            VALUES (?, ?, ?, ?)
-        ''', (room_id, sensor_type, value, timestamp_str))
-        conn.commit()
-        conn.close()
-
-def calculate_energy(room_id, appliance):
-    """Calculates kWh based on appliance ON/OFF duration."""
-    POWER_RATINGS = {
-        "AC": 1.5,
-        "Light": 0.06
-    }
-    
-    conn = sqlite3.connect('smarthome.db')
-    cursor = conn.cursor()
+        return (room_id, sensor_type, value, hour_to_ms(simulated_hour))
 
-    cursor.execute('''
-        SELECT state, is_on, timestamp FROM appliance_log 
-        WHERE room_id = ? AND appliance = ? 
-        ORDER BY timestamp ASC
-    ''', (room_id, appliance))
-    
-    logs = cursor.fetchall()
-    
-    if not logs:
-        conn.close()
-        return 0
-
-    total_hours = 0
-    last_on_time = None
-
-    for state, is_on, timestamp in logs:
-        # Robustly handle timestamp conversion
-        try:
-            ts = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S.%f')
-        except ValueError:
-            ts = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
-        
-        if is_on == 1: 
-            last_on_time = ts
-        elif is_on == 0 and last_on_time: 
-            duration = ts - last_on_time
-            total_hours += duration.total_seconds() / 3600
-            last_on_time = None 
-
-    kwh = total_hours * POWER_RATINGS.get(appliance, 0)
-    
-    if logs:
-        cursor.execute('''
-            INSERT INTO energy_log (room_id, appliance, kwh, period_start, period_end)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (room_id, appliance, kwh, logs[0][2], logs[-1][2]))
+    def update(self, data: dict):
+        row = self._to_row(data)
 
-    conn.commit()
-    conn.close()
-    return kwh
+        if not self.buffered:
+            ingest = _ingest_for(self.db_name)
+            # Inside this thread's appliance_write_batch() the reading joins the batch
+            if ingest is not None and not in_appliance_write_batch(self.db_name):
+                ingest.put("sensor", row, self.db_name)
+            else:
+                with metrics.timed("datalogger_insert"), _shard_writer(self.db_name) as conn:
+                    insert_sensor_rows(conn, [row])
+            bump_generation(self.db_name)
+            return
+
+        with self._lock:
+            self._pending.append(row)
+            due = (len(self._pending) >= self.batch_size or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+        # Queued rows count as written: readers flush before they query
+        bump_generation(self.db_name)
+        if due:
+            self.flush()
+
+    @metrics.instrumented("datalogger_flush")
+    def flush(self):
+        """Writes all queued readings in one transaction; False if they had to stay queued."""
+        with self._lock:
+            if not self._pending:
+                return True
+            # A batch on this file, in any thread, holds the write lock until it commits
+            if _shard(self.db_name).batch_conn is not None:
+                return False
+            self._last_flush = time.monotonic()
+            rows, self._pending = self._pending, []
+            try:
+                # Flushes can be triggered from any Flask worker thread; each
+                # writes over that thread's pooled connection.
+                with get_connection(self.db_name) as conn:
+                    insert_sensor_rows(conn, rows)
+            except Exception:
+                # Keep the readings queued so a later flush can retry them
+                self._pending[:0] = rows
+                raise
+        return True
+
+    def close(self):
+        """Flushes remaining readings and stops taking part in flush_pending_writes()."""
+        if self.buffered:
+            self.flush()
+            unregister_flush_hook(self.flush)
 
+@metrics.instrumented("calculate_energy")
+def calculate_energy(room_id, appliance, as_of_ms=None):
+    """
+    Calculates kWh based on appliance ON/OFF duration.
+    Reads the running totals kept by log_appliance_state, so the cost does not
+    depend on how long appliance_log is. An interval that is still open only
+    counts when as_of_ms is given (it is then measured up to that time).
+    """
+    shard = _shard()
+    with shard.lock:
+        if not shard.warm:
+            warm_state_cache()
+        return _energy_kwh(shard, (room_id, appliances.REGISTRY.canonical(appliance)), as_of_ms)
+
+@metrics.instrumented("sensor_history")
 def get_sensor_history(room_id, sensor_type):
     """Fetches sensor reading history for the API."""
-    conn = sqlite3.connect('smarthome.db')
+    page = get_sensor_page(room_id, sensor_type, limit=50, descending=True)
+    return [{"value": value, "timestamp": timestamp} for timestamp, value in page["rows"]]
+
+# Keyset pagination: a page ends at a (timestamp, id) position and the next page
+# starts strictly after it, so every page is one index range scan on the
+# (room_id, <type>, timestamp) indexes however deep the client has paged.
+# Cursors carry the series key too, so they cannot be replayed against another series.
+MAX_PAGE_SIZE = 5000
+
+def encode_cursor(series, timestamp, row_id):
+    """Opaque cursor for the position (timestamp, row_id) in series (a tuple of key strings)."""
+    raw = json.dumps([list(series), timestamp, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, series):
+    """Returns the (timestamp, row_id) position of a cursor made by encode_cursor for series."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key, timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Malformed cursor") from e
+    if key != list(series) or not isinstance(timestamp, int) or not isinstance(row_id, int):
+        raise ValueError("Cursor does not belong to this series")
+    return timestamp, row_id
+
+def _keyset_page(table, key_columns, series, columns, start_ms, end_ms, cursor, limit, descending):
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    where = [f"{column} = ?" for column in key_columns]
+    params = list(series)
+    if start_ms is not None:
+        where.append("timestamp >= ?")
+        params.append(start_ms)
+    if end_ms is not None:
+        where.append("timestamp < ?")
+        params.append(end_ms)
+    if cursor is not None:
+        where.append(f"(timestamp, id) {'<' if descending else '>'} (?, ?)")
+        params.extend(decode_cursor(cursor, series))
+    direction = "DESC" if descending else "ASC"
+
+    flush_pending_writes()
+    rows = get_connection().execute(f'''
+        SELECT id, timestamp, {", ".join(columns)} FROM {table}
+        WHERE {" AND ".join(where)}
+        ORDER BY timestamp {direction}, id {direction}
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(series, rows[-1][1], rows[-1][0])
+    return {"columns": ["timestamp"] + list(columns),
+            "rows": [row[1:] for row in rows],
+            "next_cursor": next_cursor}
+
+@metrics.instrumented("sensor_page")
+def get_sensor_page(room_id, sensor_type, start_ms=None, end_ms=None, cursor=None, limit=500, descending=False):
+    """
+    One page of sensor_log readings with timestamp in [start_ms, end_ms).
+    Returns {"columns": ["timestamp", "value"], "rows": [(timestamp, value), ...],
+    "next_cursor": str or None}; pass next_cursor back to get the following page.
+    """
+    return _keyset_page("sensor_log", ("room_id", "sensor_type"), (room_id, sensor_type), ("value",),
+                        start_ms, end_ms, cursor, limit, descending)
+
+def get_appliance_event_page(room_id, appliance, start_ms=None, end_ms=None, cursor=None, limit=500, descending=False):
+    """
+    One page of appliance_log transitions with timestamp in [start_ms, end_ms).
+    Same shape as get_sensor_page, with columns ["timestamp", "state", "is_on"].
+    """
+    return _keyset_page("appliance_log", ("room_id", "appliance"), (room_id, appliance), ("state", "is_on"),
+                        start_ms, end_ms, cursor, limit, descending)
+
+def page_to_columns(page):
+    """Columnar form of a page: {"timestamp": [...], "value": [...], ...}."""
+    return {column: [row[i] for row in page["rows"]] for i, column in enumerate(page["columns"])}
+
+def get_sensor_rollup(room_id, sensor_type, resolution="1h", start_ms=None, end_ms=None):
+    """
+    Sensor history at a ROLLUP_RESOLUTIONS resolution, oldest bucket first:
+    [{"bucket_start", "count", "avg", "min", "max"}, ...] for the buckets that
+    start in [start_ms, end_ms). Reads only sensor_rollup, so the cost depends
+    on the number of buckets, not on the number of raw readings.
+    """
+    if resolution not in ROLLUP_RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}; expected one of {sorted(ROLLUP_RESOLUTIONS)}")
+    flush_pending_writes()
+    rows = get_connection().execute('''
+        SELECT bucket_start, count, sum, min, max FROM sensor_rollup
+        WHERE bucket_ms = ? AND room_id = ? AND sensor_type = ?
+          AND bucket_start >= ? AND bucket_start < ?
+        ORDER BY bucket_start
+    ''', (ROLLUP_RESOLUTIONS[resolution], room_id, sensor_type,
+          start_ms if start_ms is not None else -2**63,
+          end_ms if end_ms is not None else 2**63 - 1)).fetchall()
+    return [{"bucket_start": bucket_start, "count": count, "avg": total / count, "min": lo, "max": hi}
+            for bucket_start, count, total, lo, hi in rows]
+
+def compact_sensor_log(keep_raw_ms, keep_5m_ms=None):
+    """
+    Retention: deletes raw sensor_log rows older than keep_raw_ms before the
+    newest reading, and, if keep_5m_ms is given, 5-minute rollup buckets older
+    than that. Hourly and daily rollups are always kept. Horizons are measured
+    in simulated time from the newest reading. Returns the deleted row counts.
+    """
+    flush_pending_writes()
+    with get_connection() as conn:
+        newest = conn.execute("SELECT MAX(timestamp) FROM sensor_log").fetchone()[0]
+        if newest is None:
+            return {"sensor_log": 0, "sensor_rollup": 0}
+        deleted = {"sensor_log": conn.execute("DELETE FROM sensor_log WHERE timestamp < ?",
+                                              (newest - keep_raw_ms,)).rowcount,
+                   "sensor_rollup": 0}
+        if keep_5m_ms is not None:
+            deleted["sensor_rollup"] = conn.execute(
+                "DELETE FROM sensor_rollup WHERE bucket_ms = ? AND bucket_start < ?",
+                (ROLLUP_RESOLUTIONS["5m"], newest - keep_5m_ms)).rowcount
+    bump_generation()
+    return deleted
+
+def use_database(path):
+    """
+    Points this module at another SQLite file (e.g. one scratch file per
+    simulation worker). The state trackers are reloaded from the new file on
+    next use; call init_db() first if it may not exist yet.
+    """
+    global DB_NAME
+    flush_pending_writes()
+    DB_NAME = path
+    release_database(path)
+    bump_generation(path)
+
+def release_database(path):
+    """
+    Drops the in-memory trackers of path (e.g. an idle home's shard) and this
+    thread's pooled connection to it; both are rebuilt from the file on next use.
+    """
+    flush_pending_writes()
+    with _shards_lock:
+        state = _shards.get(path)
+    if state is not None:
+        with state.lock:
+            with _shards_lock:
+                if _shards.get(path) is state:
+                    del _shards[path]
+    if getattr(_pool, "pid", None) == os.getpid():
+        conn = _pool.connections.pop(path, None)
+        if conn is not None:
+            conn.close()
+
+class _ShardState:
+    """
+    Per-(room_id, appliance) tracking of one database file, warmed from its
+    appliance_log once and kept authoritative by every writer. Appliances go by
+    their registry names (see appliances.py):
+      last_state: last logged is_on, so a tick whose state did not change never
+                  has to query SQLite
+      last_ts:    timestamp of that event
+      open_since: timestamp of the ON that opened the current interval
+      on_kwh:     total energy of all closed intervals
+    Writers are expected to log each pair's events in timestamp order. Each file
+    has its own lock, so homes on different shards never wait for each other.
+    synced_id is the newest appliance_log id read back from the file, from
+    where sync_state_cache() picks up rows written by other processes.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.last_state = {}
+        self.last_ts = {}
+        self.open_since = {}
+        self.on_kwh = {}
+        self.synced_id = 0
+        self.warm = False
+        # Connection shared by appliance writes inside appliance_write_batch(), and
+        # the thread running the batch; None otherwise
+        self.batch_conn = None
+        self.batch_thread = None
+
+    def clear(self):
+        self.last_state.clear()
+        self.last_ts.clear()
+        self.open_since.clear()
+        self.on_kwh.clear()
+        self.synced_id = 0
+
+_shards = {}
+_shards_lock = threading.Lock()
+
+def _shard(path=None):
+    """Tracker state of path (default: this thread's current database)."""
+    path = path or current_database()
+    with _shards_lock:
+        state = _shards.get(path)
+        if state is None:
+            state = _shards[path] = _ShardState()
+    return state
+
+def _track_event(state, key, is_on, timestamp, kwh=None):
+    """Applies one event to the trackers. kwh, if known, is the energy of the interval it closes."""
+    state.last_state[key] = is_on
+    state.last_ts[key] = timestamp
+    if is_on == 1:
+        # A repeated ON restarts the interval, as calculate_energy always did
+        state.open_since[key] = timestamp
+    elif is_on == 0 and key in state.open_since:
+        start = state.open_since.pop(key)
+        if kwh is None:
+            kwh = appliances.REGISTRY.energy_kwh(key[1], timestamp - start)
+        state.on_kwh[key] = state.on_kwh.get(key, 0) + kwh
+
+def _energy_kwh(state, key, as_of_ms=None):
+    kwh = state.on_kwh.get(key, 0)
+    if as_of_ms is not None and key in state.open_since:
+        kwh += appliances.REGISTRY.energy_kwh(key[1], max(as_of_ms - state.open_since[key], 0))
+    return kwh
+
+def warm_state_cache(path=None):
+    """Rebuilds the per-(room_id, appliance) state and energy trackers of path from the DB."""
+    path = path or current_database()
+    flush_pending_writes()
+    conn = get_connection(path)
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT value, timestamp FROM sensor_log 
-        WHERE room_id = ? AND sensor_type = ? 
-        ORDER BY timestamp DESC LIMIT 50
-    ''', (room_id, sensor_type))
-    history = [{"value": row[0], "timestamp": row[1]} for row in cursor.fetchall()]
-    conn.close()
-    return history
+    cursor.execute('''SELECT id, room_id, appliance, is_on, timestamp FROM appliance_log
+                      ORDER BY timestamp ASC, id ASC''')
+    rows = cursor.fetchall()
+
+    state = _shard(path)
+    with state.lock:
+        state.clear()
+        canonical = appliances.REGISTRY.canonical
+        for row_id, room_id, appliance, is_on, timestamp in rows:
+            _track_event(state, (room_id, canonical(appliance)), is_on, timestamp)
+            state.synced_id = max(state.synced_id, row_id)
+        state.warm = True
+
+def sync_state_cache(path=None):
+    """
+    Applies the appliance_log rows other processes wrote to path since the
+    last warm or sync, so several workers can log for one home. Rows this
+    process logged itself are already tracked and are skipped (each pair's
+    events arrive in timestamp order). Returns the number of rows applied.
+    """
+    path = path or current_database()
+    state = _shard(path)
+    with state.lock:
+        if not state.warm:
+            warm_state_cache(path)
+            return 0
+        rows = get_connection(path).execute('''
+            SELECT id, room_id, appliance, is_on, timestamp FROM appliance_log
+            WHERE id > ? ORDER BY id''', (state.synced_id,)).fetchall()
+        applied = 0
+        canonical = appliances.REGISTRY.canonical
+        for row_id, room_id, appliance, is_on, timestamp in rows:
+            key = (room_id, canonical(appliance))
+            if timestamp > state.last_ts.get(key, timestamp - 1):
+                _track_event(state, key, is_on, timestamp)
+                applied += 1
+            state.synced_id = row_id
+    if applied:
+        bump_generation(path)
+    return applied
+
+@contextmanager
+def _shard_writer(path):
+    """
+    Connection for a write to path: inside this thread's appliance_write_batch()
+    the batch's (committed with it), else the pooled one, committed on exit.
+    Writers from other threads wait for an open batch to finish.
+    """
+    state = _shard(path)
+    with state.lock:
+        if state.batch_conn is not None:
+            yield state.batch_conn
+        else:
+            conn = get_connection(path)
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            with metrics.timed("commit"):
+                conn.commit()
+
+@metrics.instrumented("appliance_write")
+def _write_appliance_event(state, room_id, appliance, state_name, is_on, timestamp):
+    """Inserts one appliance_log row (plus its energy_log interval) and updates the trackers.
+    The caller holds state.lock."""
+    key = (room_id, appliance)
+    rows = [("appliance", (room_id, appliance, state_name, is_on, timestamp))]
+    kwh = None
+    if is_on == 0 and key in state.open_since:
+        # Each closed ON interval becomes one energy_log row
+        start = state.open_since[key]
+        kwh = appliances.REGISTRY.energy_kwh(appliance, timestamp - start)
+        rows.append(("energy", (room_id, appliance, kwh, start, timestamp)))
 
-def get_connection():
-    return sqlite3.connect('smarthome.db')
+    path = current_database()
+    ingest = _ingest_for(path)
+    if state.batch_conn is None and ingest is not None:
+        ingest.put_many(rows, path)
+    else:
+        # Inside appliance_write_batch() the batch commits; otherwise commit (or roll back) here
+        with _shard_writer(path) as conn:
+            for kind, row in rows:
+                write_rows(conn, kind, [row])
+    _track_event(state, key, is_on, timestamp, kwh)
 
+def in_appliance_write_batch(path=None):
+    """True while this thread has an appliance_write_batch() open on path (default current_database())."""
+    return _shard(path).batch_thread == threading.get_ident()
+
+@contextmanager
+def appliance_write_batch(immediate=False):
+    """
+    Writes every appliance event logged inside the block over one connection
+    and commits them in a single transaction on exit. Other threads writing to
+    the same database wait on its lock until the batch is committed, so nobody
+    sees the trackers ahead of the database. On error the batch is rolled back
+    and the trackers are rebuilt from what is on disk. The batch holds SQLite's
+    write lock, so buffered DataLogger flushes are deferred until it closes;
+    unbuffered readings logged by this thread join the batch.
+    With immediate=True the write lock is taken on entry (BEGIN IMMEDIATE), so
+    the block also runs alone among other processes writing to the file.
+    """
+    path = current_database()
+    state = _shard(path)
+    with state.lock:
+        if state.batch_conn is not None:
+            # Nested batch: the outer one commits
+            yield
+            return
+        if not state.warm:
+            warm_state_cache(path)
+        # Queued rows go first, so the batch follows them in appliance_log
+        flush_pending_writes()
+        state.batch_conn = get_connection(path)
+        state.batch_thread = threading.get_ident()
+        try:
+            if immediate:
+                state.batch_conn.execute("BEGIN IMMEDIATE")
+            yield
+            with metrics.timed("commit"):
+                state.batch_conn.commit()
+        except BaseException:
+            state.batch_conn.rollback()
+            state.batch_conn = state.batch_thread = None
+            warm_state_cache(path)
+            raise
+        state.batch_conn = state.batch_thread = None
+    bump_generation(path)
+
+def record_appliance_event(room_id, appliance, state, is_on, timestamp):
+    """
+    Logs an appliance event as-is (no change detection), e.g. from
+    api.log_appliance. Aliases are stored under the registry name.
+    """
+    shard = _shard()
+    with shard.lock:
+        if not shard.warm:
+            warm_state_cache()
+        _write_appliance_event(shard, room_id, appliances.REGISTRY.canonical(appliance), state,
+                               1 if is_on else 0, timestamp)
+    bump_generation()
+
+@metrics.instrumented("appliance_log", metrics.SAMPLE_EVERY)
 def log_appliance_state(room_id, appliance, state, is_on, step):
     """Logs state transitions using the 5-minute step timeline."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Check if the state actually changed before logging
-    cursor.execute('''SELECT is_on FROM appliance_log 
-                      WHERE room_id=? AND appliance=? 
-                      ORDER BY timestamp DESC LIMIT 1''', (room_id, appliance))
-    last_entry = cursor.fetchone()
-    
-    if last_entry and last_entry[0] == (1 if is_on else 0):
-        conn.close()
-        return # Don't log if the state is the same!
-
-    # 1 step = 5 minutes
-    sim_time = SIMULATION_START + timedelta(minutes=step * 5)
-    timestamp = sim_time.strftime('%Y-%m-%d %H:%M:%S.%f')
-    
-    cursor.execute('''INSERT INTO appliance_log (room_id, appliance, state, is_on, timestamp)
-                      VALUES (?, ?, ?, ?, ?)''', (room_id, appliance, state, 1 if is_on else 0, timestamp))
-    conn.commit()
-    conn.close()
+    appliance = appliances.REGISTRY.canonical(appliance)
+    key = (room_id, appliance)
+    is_on = 1 if is_on else 0
+
+    shard = _shard()
+    with shard.lock:
+        if not shard.warm:
+            warm_state_cache()
+
+        # Check if the state actually changed before logging
+        if shard.last_state.get(key) == is_on:
+            return # Don't log if the state is the same!
 
-def calculate_total_energy():
+        # 1 step = 5 minutes
+        _write_appliance_event(shard, room_id, appliance, state, is_on, step_to_ms(step))
+    bump_generation()
+
+def save_room_states(rows):
+    """
+    Writes (room_id, version, step, state, rng) checkpoint rows to the current
+    database, replacing each room's previous one (see room_state.py).
+    """
+    path = current_database()
+    shard = _shard(path)
+    with shard.lock:
+        ingest = _ingest_for(path)
+        if shard.batch_conn is None and ingest is not None:
+            ingest.put_many([("room_state", row) for row in rows], path)
+        else:
+            with _shard_writer(path) as conn:
+                write_rows(conn, "room_state", rows)
+
+@metrics.instrumented("calculate_total_energy")
+def calculate_total_energy(as_of_ms=None):
     """Aggregates energy data for the baseline comparison in Chapter 3."""
-    conn = sqlite3.connect('smarthome.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT SUM(kwh) FROM energy_log")
-    total = cursor.fetchone()[0] or 0
-    
+    shard = _shard()
+    with shard.lock:
+        if not shard.warm:
+            warm_state_cache()
+        # Sorted so the float sums do not depend on per-process hash order
+        keys = sorted(set(shard.on_kwh) | set(shard.open_since))
+        per_pair = {key: _energy_kwh(shard, key, as_of_ms) for key in keys}
+
+    total = sum(per_pair.values())
+
     # Get breakdown per appliance
-    cursor.execute("SELECT appliance, SUM(kwh) FROM energy_log GROUP BY appliance")
-    breakdown = {row[0]: round(row[1], 2) for row in cursor.fetchall()}
-    
-    conn.close()
+    breakdown = {}
+    for (room_id, appliance), kwh in per_pair.items():
+        breakdown[appliance] = breakdown.get(appliance, 0) + kwh
+    breakdown = {appliance: round(kwh, 2) for appliance, kwh in breakdown.items()}
+
     return {"total_kwh": round(total, 2), "breakdown": breakdown}
 
 def get_db_stats():
     """Returns row counts for the /api/stats endpoint."""
-    conn = sqlite3.connect('smarthome.db')
+    flush_pending_writes()
+    conn = get_connection()
     cursor = conn.cursor()
     stats = {}
     for table in ['sensor_log', 'appliance_log', 'energy_log']:
         cursor.execute(f"SELECT COUNT(*) FROM {table}")
         stats[table] = cursor.fetchone()[0]
-    conn.close()
     return stats
 
 def reset_db():
-    """Clears all logs for a fresh, clean simulation run."""
-    conn = sqlite3.connect('smarthome.db')
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM sensor_log")
-    cursor.execute("DELETE FROM appliance_log")
-    cursor.execute("DELETE FROM energy_log")
-    conn.commit()
-    conn.close()
+    """Clears all logs, and the archived days of them, for a fresh, clean simulation run."""
+    import archive  # archive imports this module
+    flush_pending_writes()
+    with get_connection() as conn:
+        conn.execute("DELETE FROM sensor_log")
+        conn.execute("DELETE FROM sensor_rollup")
+        conn.execute("DELETE FROM appliance_log")
+        conn.execute("DELETE FROM energy_log")
+        conn.execute("DELETE FROM room_state")
+    archive.clear_archive()
+    shard = _shard()
+    with shard.lock:
+        shard.clear()
+        shard.warm = True
+    bump_generation()
     print("Database cleared for a fresh simulation.")
 
 # This block ensures the database is created if you run this file directly
@@ -0,0 +1,115 @@
+"""
+Streaming export of SHEMS logs as NDJSON or CSV.
+
+Rows are read from a dedicated SQLite connection with fetchmany() and turned
+into text chunk by chunk, so memory use stays constant however large the
+table is. Used by the /api/export/<table> endpoint and as a CLI.
+
+Usage:
+    python src/export.py sensor_log --format csv -o sensor_log.csv
+    python src/export.py energy --room Kitchen --start-ms 1771372800000 > kitchen.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+
+import database as db
+
+# Export name -> (table, columns, time column used by start_ms/end_ms)
+EXPORTS = {
+    "sensor_log": ("sensor_log", ("id", "room_id", "sensor_type", "value", "timestamp"), "timestamp"),
+    "appliance_log": ("appliance_log", ("id", "room_id", "appliance", "state", "is_on", "timestamp"), "timestamp"),
+    # One row per closed ON interval; filtered on the time the interval closed
+    "energy": ("energy_log", ("id", "room_id", "appliance", "kwh", "period_start", "period_end"), "period_end"),
+}
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+FETCH_SIZE = 5000
+
+
+def iter_rows(export, room_id=None, start_ms=None, end_ms=None, fetch_size=FETCH_SIZE):
+    """
+    Yields lists of row tuples (at most fetch_size each) for an EXPORTS entry,
+    in insertion (id) order, filtered by room and by [start_ms, end_ms) on its
+    time column.
+    """
+    if export not in EXPORTS:
+        raise ValueError(f"Unknown export {export!r}; expected one of {sorted(EXPORTS)}")
+    table, columns, time_column = EXPORTS[export]
+    where, params = [], []
+    if room_id is not None:
+        where.append("room_id = ?")
+        params.append(room_id)
+    if start_ms is not None:
+        where.append(f"{time_column} >= ?")
+        params.append(start_ms)
+    if end_ms is not None:
+        where.append(f"{time_column} < ?")
+        params.append(end_ms)
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id"
+
+    db.flush_pending_writes()
+    # Own connection: the read snapshot stays open for the whole export and
+    # must not interleave with the thread's pooled connection
+    conn = db.connect()
+    try:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def iter_export(export, fmt="ndjson", room_id=None, start_ms=None, end_ms=None):
+    """Yields text chunks of the export in fmt ('ndjson' or 'csv', with a header row)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {sorted(FORMATS)}")
+    if export not in EXPORTS:
+        raise ValueError(f"Unknown export {export!r}; expected one of {sorted(EXPORTS)}")
+    columns = EXPORTS[export][1]
+    batches = iter_rows(export, room_id, start_ms, end_ms)
+
+    if fmt == "ndjson":
+        for rows in batches:
+            yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("export", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--room", default=None, help="only this room_id")
+    parser.add_argument("--start-ms", type=int, default=None, help="epoch ms, inclusive")
+    parser.add_argument("--end-ms", type=int, default=None, help="epoch ms, exclusive")
+    parser.add_argument("-o", "--output", default=None, help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        for chunk in iter_export(args.export, args.format, args.room, args.start_ms, args.end_ms):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Vectorized control layer: the ACController / LightController FSMs of
+control.py for many rooms at once. States are held as small integer codes in
+NumPy arrays (struct of arrays) and every room advances in one vectorized
+step per tick. Transitions match the scalar classes exactly
+(tests/test_fleet_control.py).
+"""
+import numpy as np
+
+AC_STATES = ("OFF", "STANDBY", "COOLING")
+LIGHT_STATES = ("OFF", "ON")
+AC_OFF, AC_STANDBY, AC_COOLING = range(3)
+LIGHT_OFF, LIGHT_ON = range(2)
+NO_OVERRIDE = -1
+
+# Same thresholds as control.py
+AC_ON_TEMP = 28      # OFF/STANDBY -> COOLING at or above
+AC_OFF_TEMP = 24     # COOLING -> STANDBY below
+DARK_LIGHT_LEVEL = 300
+
+
+class FleetController:
+    """
+    AC and light FSM state for num_rooms rooms, the array counterpart of a
+    dict of RoomControllers. Manual overrides are per-room state codes
+    (NO_OVERRIDE when unset); as in RoomController, an overridden FSM is
+    not advanced while the override holds.
+    """
+
+    def __init__(self, num_rooms, room_names=None):
+        self.room_names = list(room_names) if room_names is not None else [f"Room {i + 1}" for i in range(num_rooms)]
+        self.ac_state = np.full(num_rooms, AC_OFF, dtype=np.int8)
+        self.light_state = np.full(num_rooms, LIGHT_OFF, dtype=np.int8)
+        self.manual_ac_override = np.full(num_rooms, NO_OVERRIDE, dtype=np.int8)
+        self.manual_light_override = np.full(num_rooms, NO_OVERRIDE, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.ac_state)
+
+    def set_manual_override(self, room, ac=None, light=None):
+        """Pins a room (index or name) to AC/light state names; None clears that override."""
+        i = self.room_names.index(room) if isinstance(room, str) else room
+        self.manual_ac_override[i] = NO_OVERRIDE if ac is None else AC_STATES.index(ac)
+        self.manual_light_override[i] = NO_OVERRIDE if light is None else LIGHT_STATES.index(light)
+
+    def step(self, occupied, temp, light_level):
+        """
+        Advances every room by one tick, like RoomController.evaluate_state
+        after its readings were updated. Inputs are arrays of shape (rooms,).
+        Returns the (ac, light) state code arrays in effect, overrides applied.
+        """
+        occupied = np.asarray(occupied, dtype=bool)
+        temp = np.asarray(temp, dtype=float)
+        light_level = np.asarray(light_level)
+
+        ac = self.ac_state
+        hot = temp >= AC_ON_TEMP
+        next_ac = np.where(ac == AC_OFF, np.where(hot, AC_COOLING, AC_STANDBY), ac)
+        next_ac = np.where((ac == AC_STANDBY) & hot, AC_COOLING, next_ac)
+        next_ac = np.where((ac == AC_COOLING) & (temp < AC_OFF_TEMP), AC_STANDBY, next_ac)
+        next_ac = np.where(occupied, next_ac, AC_OFF)
+        next_light = np.where(occupied & (light_level < DARK_LIGHT_LEVEL), LIGHT_ON, LIGHT_OFF)
+
+        ac_pinned = self.manual_ac_override != NO_OVERRIDE
+        light_pinned = self.manual_light_override != NO_OVERRIDE
+        self.ac_state = np.where(ac_pinned, self.ac_state, next_ac).astype(np.int8)
+        self.light_state = np.where(light_pinned, self.light_state, next_light).astype(np.int8)
+
+        return (np.where(ac_pinned, self.manual_ac_override, self.ac_state),
+                np.where(light_pinned, self.manual_light_override, self.light_state))
+
+    def states(self, ac_codes, light_codes):
+        """Decodes step() output into [(ac_state, light_state), ...] names per room."""
+        return [(AC_STATES[a], LIGHT_STATES[l]) for a, l in zip(ac_codes, light_codes)]
@@ -20,19 +20,24 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 def generate_table1():
     """Table 1: Energy Consumption by Room and Appliance (24-Hour Period)"""
     data = analytics.get_energy_by_room()
+    totals = analytics.get_energy_by_appliance()
+    # One column per appliance type in the data (see appliances.py)
+    headers = [f"{name} (kWh)" for name in totals if name != "total"] + ["Total (kWh)"]
+    widths = [max(len(h), 8) for h in headers]
     lines = [
         "Table 1: Energy Consumption by Room and Appliance (24-Hour Period)",
         "",
-        "| Room          | AC (kWh) | Light (kWh) | Total (kWh) |",
-        "|---------------|----------|-------------|-------------|",
+        "| Room          | " + " | ".join(h.ljust(w) for h, w in zip(headers, widths)) + " |",
+        "|---------------|" + "|".join("-" * (w + 2) for w in widths) + "|",
     ]
+
+    def table_row(label, values):
+        return f"| {label:<13} | " + " | ".join(f"{v:>{w}.4f}" for v, w in zip(values, widths)) + " |"
+
     for row in data:
-        lines.append(
-            f"| {row['room_id']:<13} | {row['AC']:>8.4f} | {row['Light']:>11.4f} | {row['total']:>11.4f} |"
-        )
+        lines.append(table_row(row["room_id"], [row[name] for name in totals]))
     if data:
-        totals = analytics.get_energy_by_appliance()
-        lines.append(f"| {'Total':<13} | {totals['AC']:>8.4f} | {totals['Light']:>11.4f} | {totals['total']:>11.4f} |")
+        lines.append(table_row("Total", list(totals.values())))
     return "\n".join(lines)
 
 
@@ -97,12 +102,12 @@ def save_charts():
     if by_room:
         fig, ax = plt.subplots(figsize=(8, 5))
         rooms = [r["room_id"] for r in by_room]
-        ac_vals = [r["AC"] for r in by_room]
-        light_vals = [r["Light"] for r in by_room]
+        names = [name for name in by_app if name != "total"]
         x = range(len(rooms))
-        w = 0.35
-        ax.bar([i - w / 2 for i in x], ac_vals, w, label="AC")
-        ax.bar([i + w / 2 for i in x], light_vals, w, label="Light")
+        w = 0.7 / max(len(names), 1)
+        for k, name in enumerate(names):
+            offset = (k - (len(names) - 1) / 2) * w
+            ax.bar([i + offset for i in x], [r[name] for r in by_room], w, label=name)
         ax.set_xticks(x)
         ax.set_xticklabels(rooms)
         ax.set_ylabel("Energy (kWh)")
@@ -118,9 +123,10 @@ def save_charts():
 
     # Chart 2: Energy by appliance (bar)
     fig, ax = plt.subplots(figsize=(6, 4))
-    apps = ["AC", "Light"]
-    vals = [by_app["AC"], by_app["Light"]]
-    bars = ax.bar(apps, vals, color=["#2ecc71", "#3498db"])
+    apps = [name for name in by_app if name != "total"]
+    vals = [by_app[name] for name in apps]
+    palette = ["#2ecc71", "#3498db", "#e67e22", "#9b59b6", "#f1c40f", "#1abc9c"]
+    bars = ax.bar(apps, vals, color=[palette[i % len(palette)] for i in range(len(apps))])
     ax.set_ylabel("Energy (kWh)")
     ax.set_title("Figure 2: Energy Consumption by Appliance Type")
     ax.grid(axis="y", alpha=0.3)
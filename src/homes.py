@@ -0,0 +1,268 @@
+"""
+Multi-home tenancy for SHEMS.
+
+Every home has its own SQLite shard file, so homes never contend for one
+write lock, plus its own room controllers and sensors. HomeRegistry builds
+a home on first use (creating or migrating its shard) and keeps at most
+max_active homes in memory. The least recently used home is evicted beyond
+that, as is any home idle for longer than idle_seconds; a home in use (between
+get() and release()) is never evicted. Evicting a home drops its controllers,
+sensors and the database trackers of its shard; all of it is rebuilt from the
+shard on the next request. Working-set memory therefore follows the active
+homes, not the total number of homes.
+
+The default home (DEFAULT_HOME) keeps using database.DB_NAME, so single-home
+deployments and the existing CLI tools see no change. Other homes live in
+<homes_dir>/<home_id>.db (SHEMS_HOMES_DIR, default "homes").
+
+Room state survives restarts and evictions: each room is checkpointed to
+the shard every checkpoint_steps ticked steps and on eviction, and a home
+is rebuilt from its checkpoints plus the logs written after them (see
+room_state.py). A shared home (shared_state=True) can be ticked by several
+worker processes at once: each tick runs under the shard's SQLite write
+lock, picks up the appliance events and checkpoints other workers wrote,
+and checkpoints its rooms before committing, so every worker decides from
+the same state. Shared homes need synchronous writes (no ingest queue).
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import database as db
+import room_state
+from simulation import ROOMS_CONFIG, build_rooms, tick_range, tick_room
+
+DEFAULT_HOME = "default"
+HOMES_DIR = os.environ.get("SHEMS_HOMES_DIR", "homes")
+HOME_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+CHECKPOINT_STEPS = 12  # one simulated hour
+# Rows one room tick can queue: three readings, an AC and a light event with
+# the energy interval each may close, and a checkpoint
+TICK_ROWS = 8
+
+
+def validate_home_id(home_id):
+    """Raises ValueError unless home_id is 1-64 letters, digits, '_' or '-' (it names a file)."""
+    if not isinstance(home_id, str) or not HOME_ID_PATTERN.match(home_id):
+        raise ValueError(f"Invalid home_id {home_id!r}")
+    return home_id
+
+
+def shard_path(home_id, homes_dir=HOMES_DIR):
+    """The SQLite file holding home_id's data."""
+    if home_id == DEFAULT_HOME:
+        return db.DB_NAME
+    return os.path.join(homes_dir, f"{validate_home_id(home_id)}.db")
+
+
+class Home:
+    """One home: its shard file, room controllers and sensors."""
+
+    def __init__(self, home_id, db_path, rooms_config, seed=None,
+                 checkpoint_steps=CHECKPOINT_STEPS, shared_state=False):
+        self.home_id = home_id
+        self.db_path = db_path
+        self.checkpoint_steps = checkpoint_steps
+        self.shared_state = shared_state
+        self.last_used = time.monotonic()
+        # Callers between HomeRegistry.get() and release(); guarded by the registry lock
+        self.users = 0
+        with db.using_database(db_path):
+            db.init_db()
+            # Readings follow the process-wide ingest queue, if any, into this shard
+            self.logger = db.DataLogger(db_name=db_path)
+            self.controllers, self.sensors = build_rooms(rooms_config, self.logger, seed)
+            # Last step ticked and checkpoint version per room, resumed from the shard
+            self.steps, self.versions = room_state.restore_rooms(self.sensors, self.controllers)
+        self._checkpointed = dict(self.steps)
+
+    def database(self):
+        """Context manager routing this thread's database calls to the home's shard."""
+        return db.using_database(self.db_path)
+
+    def tick(self, room_id, step):
+        """
+        Ticks one room (simulation.tick_room). Call inside database(). Raises
+        IngestQueueFull, with the room untouched, if the ingest queue has no room.
+        """
+        if self.shared_state:
+            return self.tick_range([room_id], [step])[0][1][0]
+        # Room for the whole tick up front: its sensors advance as soon as it starts
+        with db.reserve_ingest(TICK_ROWS):
+            states = tick_room(self.sensors[room_id], self.controllers[room_id], room_id, step)
+            self._ticked([room_id], step)
+        return states
+
+    def tick_range(self, room_ids, steps):
+        """
+        Runs simulation.tick_range in one appliance_write_batch() and returns
+        its (step, states) results. Call inside database().
+        """
+        with db.appliance_write_batch(immediate=self.shared_state):
+            if self.shared_state:
+                self._catch_up(room_ids)
+            results = list(tick_range(self.sensors, self.controllers, room_ids, steps))
+            if results:
+                self._ticked(room_ids, results[-1][0])
+        db.flush_pending_writes()
+        return results
+
+    def _ticked(self, room_ids, step):
+        for room_id in room_ids:
+            self.steps[room_id] = step
+        due = [room_id for room_id in room_ids
+               if self.shared_state or room_id not in self._checkpointed
+               or abs(step - self._checkpointed[room_id]) >= self.checkpoint_steps]
+        if due:
+            self.checkpoint(due)
+
+    def _catch_up(self, room_ids):
+        """Applies what other workers logged and checkpointed for this shard. Caller holds the write lock."""
+        db.sync_state_cache()
+        stale = [room_id for room_id, (version, *_) in room_state.load_checkpoints(room_ids).items()
+                 if version > self.versions.get(room_id, 0)]
+        if stale:
+            steps, versions = room_state.restore_rooms(self.sensors, self.controllers, stale)
+            self.steps.update(steps)
+            self.versions.update(versions)
+            self._checkpointed.update(steps)
+
+    def checkpoint(self, room_ids=None):
+        """Checkpoints the rooms (default: every room ticked since its last checkpoint)."""
+        if room_ids is None:
+            room_ids = [room_id for room_id, step in self.steps.items() if self._checkpointed.get(room_id) != step]
+        steps = {room_id: self.steps[room_id] for room_id in room_ids if room_id in self.steps}
+        with self.database():
+            room_state.save_checkpoints(self.sensors, self.controllers, steps, self.versions)
+        self._checkpointed.update(steps)
+
+
+class HomeRegistry:
+    """Lazily built homes, least recently used first, capped at max_active."""
+
+    def __init__(self, homes_dir=HOMES_DIR, rooms_config=ROOMS_CONFIG, seed=None,
+                 max_active=1000, idle_seconds=900.0, checkpoint_steps=CHECKPOINT_STEPS, shared_state=False):
+        self.homes_dir = homes_dir
+        self.rooms_config = rooms_config
+        self.seed = seed
+        self.max_active = max_active
+        self.idle_seconds = idle_seconds
+        self.checkpoint_steps = checkpoint_steps
+        self.shared_state = shared_state
+        self._homes = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per home being built, so a slow shard open blocks only that home
+        self._building = {}
+        # Evicted homes still being checkpointed: home_id -> Event set once done
+        self._unloading = {}
+        self._stats = {"loads": 0, "evictions": 0}
+
+    def _home_seed(self, home_id):
+        if self.seed is None:
+            return None
+        # The default home keeps the plain seed, reproducible with run_24h_sim.py --seed
+        return self.seed if home_id == DEFAULT_HOME else f"{self.seed}:{home_id}"
+
+    def get(self, home_id):
+        """
+        The Home for home_id, built on first use; marks it most recently used
+        and in use until the matching release().
+        """
+        with self._lock:
+            home = self._homes.get(home_id)
+            if home is not None:
+                self._homes.move_to_end(home_id)
+                home.last_used = time.monotonic()
+                home.users += 1
+                evicted = self._take_evictions()
+            else:
+                build_lock = self._building.setdefault(home_id, threading.Lock())
+        if home is None:
+            home, evicted = self._build(home_id, build_lock)
+        self._unload(evicted)
+        return home
+
+    def acquire(self, home):
+        """Marks a home already obtained from get() in use once more (e.g. by a streamed response)."""
+        with self._lock:
+            home.users += 1
+
+    def release(self, home):
+        """Ends one use of home from get() or acquire(); it may be evicted again once unused."""
+        with self._lock:
+            home.users -= 1
+            evicted = self._take_evictions()
+        self._unload(evicted)
+
+    def _build(self, home_id, build_lock):
+        with build_lock:
+            with self._lock:
+                home = self._homes.get(home_id)
+                if home is not None:
+                    home.users += 1
+                    return home, []
+                unloading = self._unloading.get(home_id)
+            try:
+                if unloading is not None:
+                    # Rebuild from the checkpoint its eviction is still writing
+                    unloading.wait()
+                path = shard_path(home_id, self.homes_dir)
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                home = Home(home_id, path, self.rooms_config, self._home_seed(home_id),
+                            self.checkpoint_steps, self.shared_state)
+                with self._lock:
+                    home.users += 1
+                    self._homes[home_id] = home
+                    self._stats["loads"] += 1
+                    return home, self._take_evictions()
+            finally:
+                with self._lock:
+                    self._building.pop(home_id, None)
+
+    def _take_evictions(self):
+        """
+        Removes and returns the unused homes over max_active or idle too long,
+        least recently used first. Caller holds _lock and passes them to _unload().
+        """
+        evicted = []
+        now = time.monotonic()
+        for home_id, home in list(self._homes.items()):
+            if len(self._homes) <= self.max_active and now - home.last_used <= self.idle_seconds:
+                break
+            if home.users:
+                continue
+            del self._homes[home_id]
+            self._unloading[home_id] = threading.Event()
+            evicted.append(home)
+        self._stats["evictions"] += len(evicted)
+        return evicted
+
+    def _unload(self, evicted):
+        """Checkpoints and releases evicted homes; a rebuild of one waits for this."""
+        for home in evicted:
+            try:
+                home.checkpoint()
+                db.release_database(home.db_path)
+            finally:
+                with self._lock:
+                    self._unloading.pop(home.home_id).set()
+
+    def evict_idle(self):
+        """Evicts unused homes idle for longer than idle_seconds; returns their ids."""
+        with self._lock:
+            evicted = self._take_evictions()
+        self._unload(evicted)
+        return [home.home_id for home in evicted]
+
+    def checkpoint_all(self):
+        """Checkpoints every active home's rooms ticked since their last checkpoint (e.g. at shutdown)."""
+        with self._lock:
+            homes = list(self._homes.values())
+        for home in homes:
+            home.checkpoint()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, active=len(self._homes), max_active=self.max_active)
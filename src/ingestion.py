@@ -0,0 +1,253 @@
+"""
+Asynchronous ingestion pipeline for SHEMS.
+
+A bounded in-memory queue of sensor_log / appliance_log / energy_log rows,
+drained by one writer thread that commits everything waiting in the queue
+(up to max_batch rows) in a single transaction. Once installed with
+database.set_ingest_queue(), log_appliance_state and unbuffered DataLoggers
+only enqueue rows, so a tick no longer waits on SQLite. The in-memory state
+trackers are still updated synchronously, so calculate_energy and
+/api/energy stay exact. room_state checkpoints take the same path.
+
+One queue can serve many database files (e.g. one shard per home): every
+row carries the file it was logged for, and each batch is committed per file.
+
+When the queue is full, producers block for up to put_timeout seconds
+(backpressure) and then get IngestQueueFull. A producer that must not fail
+halfway through a group of rows (e.g. a tick, whose sensors have already
+advanced) reserves room for the group first: reserve() raises
+IngestQueueFull before the group starts, and puts inside it never fail. drain() waits until everything
+enqueued so far is committed; it is registered as a flush hook, so every
+reader that calls database.flush_pending_writes() sees all queued rows.
+"""
+import atexit
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import database as db
+import metrics
+
+# Row kinds, keyed like database.INSERT_SQL
+SENSOR, APPLIANCE, ENERGY, ROOM_STATE = "sensor", "appliance", "energy", "room_state"
+
+
+class IngestQueueFull(Exception):
+    """Raised when a row could not be enqueued within put_timeout."""
+
+
+class IngestQueue:
+    """
+    Bounded write queue with a dedicated writer thread.
+    Rows are written in the order they were enqueued, per table and file.
+    With db_name None it accepts rows for any file; otherwise only for db_name.
+    """
+
+    def __init__(self, db_name=None, maxsize=10_000, max_batch=2_000, put_timeout=5.0, retry_delay=0.05):
+        self.db_name = db_name
+        self.maxsize = maxsize
+        self.max_batch = max_batch
+        self.put_timeout = put_timeout
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        # Serializes put(): the queue's order then matches the order rows are counted in
+        self._put_lock = threading.Lock()
+        # Rows queued and not yet taken by the writer, plus rows reserved and not
+        # yet put; kept at most maxsize outside reservations, guarded by _space
+        self._space = threading.Condition()
+        self._used = 0
+        # This thread's reserve(): rows still reserved, None outside one
+        self._local = threading.local()
+        self._thread = None
+        self._stopping = False
+        # Counters guarded by _cond; drain() waits on it for `written` to catch up
+        self._cond = threading.Condition()
+        self._enqueued = 0
+        self._written = 0
+        self._stats = {
+            "batches": 0,
+            "max_depth": 0,
+            "blocked_puts": 0,
+            "rejected_puts": 0,
+            "write_errors": 0,
+            "last_write_ms": 0.0,
+            "max_write_ms": 0.0,
+            "total_write_ms": 0.0,
+            "max_lag_ms": 0.0,
+        }
+
+    def start(self):
+        """Starts the writer thread and hooks drain() into database.flush_pending_writes()."""
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="shems-ingest-writer", daemon=True)
+            self._thread.start()
+            db.register_flush_hook(self.drain)
+            atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=None):
+        """Writes everything still queued, then stops the writer thread."""
+        if self._thread is None:
+            return
+        self.drain(timeout)
+        self._stopping = True
+        self._thread.join(timeout)
+        self._thread = None
+        db.unregister_flush_hook(self.drain)
+
+    def put(self, kind, row, path=None):
+        """
+        Enqueues one row for table `kind` (SENSOR, APPLIANCE, ENERGY or ROOM_STATE) of
+        path (default: db_name, else this thread's current database).
+        """
+        item = (kind, row, path or self.db_name or db.current_database(), time.monotonic())
+        reserved = getattr(self._local, "reserved", None)
+        if reserved:
+            self._local.reserved -= 1
+        elif reserved is None:
+            self._wait_for_room(1)
+        else:
+            # Past its reservation a reserve() block may run the queue over maxsize
+            with self._space:
+                self._used += 1
+        # Queued and counted under one lock: a row queued ahead of ours but not yet
+        # counted would otherwise let drain() return before ours is written
+        with self._put_lock:
+            self._queue.put_nowait(item)
+            with self._cond:
+                self._enqueued += 1
+                self._stats["max_depth"] = max(self._stats["max_depth"], self._queue.qsize())
+
+    @contextmanager
+    def reserve(self, rows):
+        """
+        Holds room for `rows` rows for this thread's puts inside the block.
+        Raises IngestQueueFull, before the block runs, if the room does not
+        free up within put_timeout. Puts inside the block never block or raise.
+        A nested reserve() shares the outer one.
+        """
+        if getattr(self._local, "reserved", None) is not None:
+            yield
+            return
+        rows = min(rows, self.maxsize)
+        self._wait_for_room(rows)
+        self._local.reserved = rows
+        try:
+            yield
+        finally:
+            unused, self._local.reserved = self._local.reserved, None
+            if unused:
+                self._free(unused)
+
+    def _wait_for_room(self, rows):
+        with self._space:
+            if self._used + rows > self.maxsize:
+                with self._cond:
+                    self._stats["blocked_puts"] += 1
+                if not self._space.wait_for(lambda: self._used + rows <= self.maxsize, self.put_timeout):
+                    with self._cond:
+                        self._stats["rejected_puts"] += 1
+                    raise IngestQueueFull(f"ingest queue full ({self.maxsize} rows)")
+            self._used += rows
+
+    def _free(self, rows):
+        with self._space:
+            self._used -= rows
+            self._space.notify_all()
+
+    def put_many(self, items, path=None):
+        """Enqueues (kind, row) pairs for path in order."""
+        for kind, row in items:
+            self.put(kind, row, path)
+
+    def drain(self, timeout=None):
+        """
+        Blocks until every row enqueued before the call is committed and
+        returns True. Returns False on timeout, or straight away if this
+        thread has an appliance_write_batch() open on the file being drained
+        (its write lock would hold the writer up).
+        """
+        if self._thread is None:
+            return self._queue.empty()
+        if db.in_appliance_write_batch(self.db_name or db.current_database()):
+            return False
+        with self._cond:
+            target = self._enqueued
+            return self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def stats(self):
+        """Queue depth, throughput and write latency counters."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "depth": self._queue.qsize(),
+                "capacity": self.maxsize,
+                "enqueued": self._enqueued,
+                "written": self._written,
+            })
+        batches = stats["batches"]
+        stats["avg_write_ms"] = round(stats.pop("total_write_ms") / batches, 3) if batches else 0.0
+        return stats
+
+    def _take_batch(self):
+        try:
+            items = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        while len(items) < self.max_batch:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._free(len(items))
+        return items
+
+    @staticmethod
+    def _group(items):
+        by_path = {}
+        for kind, row, path, _ in items:
+            by_path.setdefault(path, {SENSOR: [], APPLIANCE: [], ENERGY: [], ROOM_STATE: []})[kind].append(row)
+        return by_path
+
+    @metrics.instrumented("ingest_write")
+    def _write(self, by_path):
+        """Commits each file's rows in one transaction, removing them from by_path once committed."""
+        while by_path:
+            path, grouped = next(iter(by_path.items()))
+            with db.get_connection(path) as conn:
+                if grouped[SENSOR]:
+                    db.insert_sensor_rows(conn, grouped[SENSOR])
+                for kind in (APPLIANCE, ENERGY, ROOM_STATE):
+                    if grouped[kind]:
+                        db.write_rows(conn, kind, grouped[kind])
+            del by_path[path]
+
+    def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            items = self._take_batch()
+            if not items:
+                continue
+            pending = self._group(items)
+            while True:
+                start = time.monotonic()
+                try:
+                    # A retry only writes the files whose transaction did not commit
+                    self._write(pending)
+                    break
+                except Exception:
+                    # e.g. locked by an appliance_write_batch(); the rows stay ours, retry
+                    with self._cond:
+                        self._stats["write_errors"] += 1
+                    time.sleep(self.retry_delay)
+            done = time.monotonic()
+            write_ms = (done - start) * 1000
+            with self._cond:
+                self._written += len(items)
+                self._stats["batches"] += 1
+                self._stats["last_write_ms"] = round(write_ms, 3)
+                self._stats["max_write_ms"] = round(max(self._stats["max_write_ms"], write_ms), 3)
+                self._stats["total_write_ms"] += write_ms
+                self._stats["max_lag_ms"] = round(max(self._stats["max_lag_ms"], (done - items[0][3]) * 1000), 3)
+                self._cond.notify_all()
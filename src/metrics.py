@@ -0,0 +1,241 @@
+"""
+Low-overhead instrumentation for SHEMS: latency histograms per stage and
+labelled counters, rendered in the Prometheus text format by /api/metrics.
+
+    @metrics.instrumented("appliance_log")
+    def log_appliance_state(...): ...
+
+    with metrics.timed("commit"):
+        conn.commit()
+
+    metrics.count("rows_written", len(rows), "sensor_log")
+
+Histograms have fixed buckets (1 µs to 10 s), so an observation is a
+bisect and three increments, and p50/p95/p99 are estimated from the
+buckets when rendered. Stages nest: "tick" contains "sensor_read" (which
+contains "observer_fanout" and, within it, "datalogger_insert"),
+"fsm_evaluate" and "appliance_log" (which contains "appliance_write").
+The stages run several times per room tick are sampled: one call in
+SAMPLE_EVERY is timed (their _count and _sum cover the timed calls only),
+which keeps the cost per tick to a counter increment per stage. Every SQL
+statement run through database.connect() connections is counted by verb.
+
+Enabled unless SHEMS_METRICS=0; set_enabled() switches it at runtime.
+benchmarks/bench_metrics.py measures the overhead per tick.
+"""
+import bisect
+import functools
+import itertools
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the histogram buckets: 1 µs to 10 s in 1-2.5-5 steps
+BUCKETS = tuple(m * 10.0 ** e for e in range(-6, 1) for m in (1, 2.5, 5)) + (10.0,)
+QUANTILES = (0.5, 0.95, 0.99)
+# Hot-path stages time one call in SAMPLE_EVERY
+SAMPLE_EVERY = int(os.environ.get("SHEMS_METRICS_SAMPLE", "16"))
+
+# Counter name -> (help text, label name)
+COUNTERS = {
+    "rows_written": ("Rows written to SQLite", "table"),
+    "sql_statements": ("SQL statements executed (an executemany counts once)", "verb"),
+}
+
+_enabled = os.environ.get("SHEMS_METRICS", "1").lower() not in ("0", "false", "no")
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_verbs = {}  # SQL text -> its first keyword
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value):
+    global _enabled
+    _enabled = bool(value)
+
+
+class Histogram:
+    """Bucketed latency distribution of one stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(BUCKETS) + 1)  # the last bucket is +Inf
+            self.sum = 0.0
+            self.count = 0
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    @staticmethod
+    def quantile(counts, q):
+        """Estimate of the q-quantile, interpolated linearly within its bucket."""
+        total = sum(counts)
+        if not total:
+            return 0.0
+        target = q * total
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= target:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[min(index, len(BUCKETS) - 1)]
+                return lower + (upper - lower) * (target - seen) / bucket_count
+            seen += bucket_count
+        return BUCKETS[-1]
+
+
+def histogram(stage):
+    """The histogram of stage, created on first use."""
+    hist = _histograms.get(stage)
+    if hist is None:
+        with _lock:
+            hist = _histograms.setdefault(stage, Histogram())
+    return hist
+
+
+def observe(stage, seconds):
+    if _enabled:
+        histogram(stage).observe(seconds)
+
+
+class _Timer:
+    __slots__ = ("hist", "start")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timed(stage):
+    """Context manager recording the time spent in the block under stage."""
+    return _Timer(histogram(stage)) if _enabled else _NO_TIMER
+
+
+def instrumented(stage, sample_every=1):
+    """Decorator recording the duration of every call (or one in sample_every) under stage."""
+    def decorate(fn):
+        hist = histogram(stage)
+        calls = itertools.count()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled or next(calls) % sample_every:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1, label=""):
+    """Adds n to counter name (see COUNTERS) for the given label value."""
+    if _enabled:
+        key = (name, label)
+        with _lock:
+            _counters[key] = _counters.get(key, 0) + n
+
+
+def count_statement(sql):
+    """Counts one SQL statement under its verb (SELECT, INSERT, ...)."""
+    if _enabled:
+        verb = _verbs.get(sql)
+        if verb is None:
+            words = sql.split(None, 1)
+            verb = _verbs[sql] = words[0].upper() if words else ""
+        count("sql_statements", 1, verb)
+
+
+def reset():
+    """Zeroes every histogram and counter."""
+    with _lock:
+        histograms = list(_histograms.values())
+        _counters.clear()
+    for hist in histograms:
+        hist.reset()
+
+
+def _format(value):
+    return f"{value:.9g}" if value != float("inf") else "+Inf"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render(gauges=None):
+    """
+    All metrics in the Prometheus text exposition format (version 0.0.4).
+    gauges is an optional {name: (help, value)} of extra gauges, e.g. queue depth.
+    """
+    lines = [
+        "# HELP shems_stage_seconds Time spent per call in each instrumented stage",
+        "# TYPE shems_stage_seconds histogram",
+    ]
+    with _lock:
+        stages = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+    snapshots = [(stage, hist.snapshot()) for stage, hist in stages]
+    for stage, (counts, total, n) in snapshots:
+        if not n:
+            continue
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS + (float("inf"),), counts):
+            cumulative += bucket_count
+            lines.append(f'shems_stage_seconds_bucket{{stage="{stage}",le="{_format(bound)}"}} {cumulative}')
+        lines.append(f'shems_stage_seconds_sum{{stage="{stage}"}} {_format(total)}')
+        lines.append(f'shems_stage_seconds_count{{stage="{stage}"}} {n}')
+
+    lines += [
+        "# HELP shems_stage_quantile_seconds p50/p95/p99 per stage, estimated from shems_stage_seconds buckets",
+        "# TYPE shems_stage_quantile_seconds gauge",
+    ]
+    for stage, (counts, _, n) in snapshots:
+        if n:
+            for q in QUANTILES:
+                lines.append(f'shems_stage_quantile_seconds{{stage="{stage}",quantile="{q}"}} '
+                             f'{_format(Histogram.quantile(counts, q))}')
+
+    for name, (help_text, label) in COUNTERS.items():
+        lines += [f"# HELP shems_{name}_total {help_text}", f"# TYPE shems_{name}_total counter"]
+        for (counter, value_label), value in counters:
+            if counter == name:
+                lines.append(f'shems_{name}_total{{{label}="{_escape(value_label)}"}} {value}')
+
+    for name, (help_text, value) in (gauges or {}).items():
+        lines += [f"# HELP shems_{name} {help_text}", f"# TYPE shems_{name} gauge", f"shems_{name} {_format(value)}"]
+    return "\n".join(lines) + "\n"
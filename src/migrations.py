@@ -0,0 +1,131 @@
+"""
+Versioned schema migrations for the SHEMS SQLite database.
+Each migration runs once, inside its own transaction, and is recorded in the
+schema_migrations table, so existing smarthome.db files are upgraded in place
+the next time init_db() runs.
+"""
+
+# Text timestamp -> integer epoch milliseconds. julianday() understands both the
+# strftime('%Y-%m-%d %H:%M:%S.%f') strings and str(datetime.now()) values.
+_EPOCH_MS = "CAST(ROUND((julianday({col}) - 2440587.5) * 86400000.0) AS INTEGER)"
+
+
+def _text_timestamps_to_ms(table, column):
+    return f"UPDATE {table} SET {column} = {_EPOCH_MS.format(col=column)} WHERE typeof({column}) = 'text'"
+
+
+# (version, description, statements). Append new migrations; never edit old ones.
+MIGRATIONS = [
+    (1, "Composite covering indexes for per-room history and transition queries", [
+        # get_sensor_history: WHERE room_id, sensor_type ORDER BY timestamp
+        '''CREATE INDEX IF NOT EXISTS idx_sensor_log_room_type_ts
+           ON sensor_log (room_id, sensor_type, timestamp, value)''',
+        # calculate_energy, warm_state_cache, analytics: WHERE room_id, appliance ORDER BY timestamp
+        '''CREATE INDEX IF NOT EXISTS idx_appliance_log_room_appliance_ts
+           ON appliance_log (room_id, appliance, timestamp, is_on, state)''',
+        # calculate_total_energy breakdowns
+        '''CREATE INDEX IF NOT EXISTS idx_energy_log_room_appliance
+           ON energy_log (room_id, appliance, kwh)''',
+    ]),
+    (2, "Store timestamps as integer epoch milliseconds", [
+        _text_timestamps_to_ms("sensor_log", "timestamp"),
+        _text_timestamps_to_ms("appliance_log", "timestamp"),
+        _text_timestamps_to_ms("energy_log", "period_start"),
+        _text_timestamps_to_ms("energy_log", "period_end"),
+    ]),
+    (3, "energy_log holds one row per closed ON interval instead of recalculated summaries", [
+        "DELETE FROM energy_log",
+        # Ratings as of this migration (AC 1.5 kW, Light 0.06 kW)
+        '''INSERT INTO energy_log (room_id, appliance, kwh, period_start, period_end)
+           SELECT room_id, appliance,
+                  (next_ts - timestamp) / 3600000.0 *
+                      CASE appliance WHEN 'AC' THEN 1.5 WHEN 'Light' THEN 0.06 ELSE 0 END,
+                  timestamp, next_ts
+           FROM (
+               SELECT room_id, appliance, is_on, timestamp,
+                      LEAD(is_on) OVER w AS next_is_on,
+                      LEAD(timestamp) OVER w AS next_ts
+               FROM appliance_log
+               WINDOW w AS (PARTITION BY room_id, appliance ORDER BY timestamp, id)
+           )
+           WHERE is_on = 1 AND next_is_on = 0
+           ORDER BY next_ts''',
+    ]),
+    (4, "sensor_rollup: per-bucket count/sum/min/max of sensor readings at 5 min, 1 h and 1 day", [
+        '''CREATE TABLE IF NOT EXISTS sensor_rollup (
+               bucket_ms INTEGER NOT NULL,    -- bucket width: 300000, 3600000 or 86400000
+               room_id TEXT NOT NULL,
+               sensor_type TEXT NOT NULL,
+               bucket_start INTEGER NOT NULL, -- epoch ms, a multiple of bucket_ms
+               count INTEGER NOT NULL,
+               sum REAL NOT NULL,
+               min REAL NOT NULL,
+               max REAL NOT NULL,
+               PRIMARY KEY (bucket_ms, room_id, sensor_type, bucket_start)
+           ) WITHOUT ROWID''',
+    ] + [
+        f'''INSERT INTO sensor_rollup
+               SELECT {bucket_ms}, room_id, sensor_type, (timestamp / {bucket_ms}) * {bucket_ms},
+                      COUNT(*), SUM(value), MIN(value), MAX(value)
+               FROM sensor_log
+               GROUP BY room_id, sensor_type, timestamp / {bucket_ms}'''
+        for bucket_ms in (300_000, 3_600_000, 86_400_000)
+    ]),
+    (5, "room_state: checkpointed controller and sensor state per room", [
+        '''CREATE TABLE IF NOT EXISTS room_state (
+               room_id TEXT PRIMARY KEY,
+               version INTEGER NOT NULL,  -- bumped by every checkpoint of the room
+               step INTEGER NOT NULL,     -- last step ticked before the checkpoint
+               state TEXT NOT NULL,       -- JSON, see room_state.snapshot_room
+               rng BLOB                   -- sensor RNG states of seeded rooms
+           )''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Returns the highest applied migration version (0 for a fresh database)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn):
+    """Applies all pending migrations in order and returns the resulting version."""
+    current = get_schema_version(conn)
+    conn.commit()
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        # Take the write lock, then re-read the version: another process may
+        # have applied this migration since we looked
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = get_schema_version(conn)
+            if version <= current:
+                conn.commit()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute("INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                         (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+        print(f"Applied schema migration {version}: {description}")
+
+    return current
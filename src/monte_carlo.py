@@ -0,0 +1,150 @@
+"""
+Monte Carlo savings runner for SHEMS.
+
+Runs many independent headless simulations (see simulation.py), one per
+(seed, room configuration), fanned out over a ProcessPoolExecutor. Every run
+has its own scratch SQLite file and per-sensor seeded RNGs, so results are
+reproducible and do not depend on the number of workers or on run order.
+Reports the distribution of kWh, savings % and cost across runs, with a 95%
+confidence interval for each mean. Cost is priced under the active tariff
+(analytics.get_tariff(), or --tariff), as /api/analytics prices it.
+
+Usage:
+    python src/monte_carlo.py
+    python src/monte_carlo.py --runs 500 --days 1 --rooms 4 8 --workers 8
+    python src/monte_carlo.py --tariff tou.json
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import analytics
+import database as db
+from simulation import BASELINE_KWH_PER_ROOM_DAY, SimulationEngine, rooms_config_for
+from tariff import Tariff
+
+Z_95 = 1.96
+METRICS = ("total_kwh", "savings_percent", "cost_ngn")
+
+
+def run_one(task):
+    """
+    Runs one simulation in this process against its own scratch database.
+    task is (seed, days, num_rooms, scratch_dir, tariff). Returns a dict of results.
+    """
+    seed, days, num_rooms, scratch_dir, tariff = task
+    path = os.path.join(scratch_dir, f"run_{num_rooms}_{seed}.db")
+    # init_db and migrations report progress on stdout; keep workers quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.use_database(path)
+        db.init_db()
+        engine = SimulationEngine(rooms_config_for(num_rooms), seed=seed)
+        try:
+            engine.run(days)
+            energy = db.calculate_total_energy()
+            cost = analytics.get_cost_breakdown(tariff=tariff)["total_ngn"]
+        finally:
+            engine.close()
+            db.close_connections()
+    os.remove(path)
+
+    baseline = BASELINE_KWH_PER_ROOM_DAY * num_rooms * days
+    total = energy["total_kwh"]
+    return {
+        "seed": seed,
+        "rooms": num_rooms,
+        "days": days,
+        "total_kwh": total,
+        "savings_percent": (baseline - total) / baseline * 100 if baseline > 0 else 0,
+        "cost_ngn": cost,
+    }
+
+
+def run_monte_carlo(runs=100, days=1, room_counts=(4,), base_seed=0, workers=None, tariff=None):
+    """
+    Runs `runs` seeds (base_seed, base_seed + 1, ...) for every room count,
+    priced under tariff (default: analytics.get_tariff()).
+    Returns the per-run result dicts, ordered by room count then seed.
+    """
+    # Passed to every run: worker processes do not share this one's set_tariff()
+    tariff = tariff or analytics.get_tariff()
+    tasks_dir = tempfile.mkdtemp(prefix="shems_mc_")
+    tasks = [(base_seed + i, days, num_rooms, tasks_dir, tariff)
+             for num_rooms in room_counts for i in range(runs)]
+    workers = workers or os.cpu_count() or 1
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Several runs per task message keeps IPC small next to the simulation work
+            chunksize = max(1, len(tasks) // (workers * 4))
+            return list(pool.map(run_one, tasks, chunksize=chunksize))
+    finally:
+        with contextlib.suppress(OSError):
+            os.rmdir(tasks_dir)
+
+
+def summarize(values):
+    """Mean, standard deviation, 95% CI of the mean and 5th/50th/95th percentiles."""
+    n = len(values)
+    mean = statistics.fmean(values)
+    sd = statistics.stdev(values) if n > 1 else 0.0
+    half_width = Z_95 * sd / math.sqrt(n)
+    ordered = sorted(values)
+
+    def percentile(p):
+        return ordered[min(n - 1, int(round(p / 100 * (n - 1))))]
+
+    return {
+        "n": n,
+        "mean": mean,
+        "sd": sd,
+        "ci95": (mean - half_width, mean + half_width),
+        "p5": percentile(5),
+        "p50": percentile(50),
+        "p95": percentile(95),
+    }
+
+
+def summarize_by_rooms(results):
+    """{num_rooms: {metric: summarize(...)}} over the results of run_monte_carlo."""
+    by_rooms = {}
+    for result in results:
+        by_rooms.setdefault(result["rooms"], []).append(result)
+    return {
+        rooms: {metric: summarize([r[metric] for r in group]) for metric in METRICS}
+        for rooms, group in by_rooms.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100, help="seeds per room configuration")
+    parser.add_argument("--days", type=int, default=1, help="simulated days per run")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[4], help="room counts to simulate")
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--tariff", default=None, help="JSON time-of-use schedule (default: flat Band A, see tariff.py)")
+    args = parser.parse_args()
+
+    tariff = Tariff.from_json(args.tariff) if args.tariff else None
+    start = time.perf_counter()
+    results = run_monte_carlo(args.runs, args.days, args.rooms, args.seed, args.workers, tariff)
+    elapsed = time.perf_counter() - start
+    print(f"{len(results)} runs in {elapsed:.1f}s ({len(results) / elapsed:.1f} runs/s)\n")
+
+    print(f"{'rooms':>5} {'metric':<16} {'mean':>10} {'95% CI':>23} {'sd':>9} {'p5':>10} {'p50':>10} {'p95':>10}")
+    for rooms, summary in summarize_by_rooms(results).items():
+        for metric in METRICS:
+            s = summary[metric]
+            ci = f"[{s['ci95'][0]:.2f}, {s['ci95'][1]:.2f}]"
+            print(f"{rooms:>5} {metric:<16} {s['mean']:>10.2f} {ci:>23} {s['sd']:>9.2f} "
+                  f"{s['p5']:>10.2f} {s['p50']:>10.2f} {s['p95']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Persisted room state for SHEMS.
+
+A room's decisions depend on state held in memory: the AC and light FSM
+states, the controller's last readings and the sensors' own state (the AC
+cooling offset, the PIR dwell counter and, for seeded rooms, the sensor
+RNGs). A checkpoint stores all of it as one room_state row per room: a small
+JSON document plus the RNG states as a BLOB (2.5 kB per seeded sensor,
+nothing for unseeded rooms).
+
+restore_rooms() loads a home's checkpoints and then replays what was logged
+after each one: the last appliance_log state of each appliance becomes the
+FSM state and the last sensor_log readings become the controller's inputs,
+so a restart resumes every room's latest logged decisions even if the
+process died between checkpoints. Sensor internals are as of the checkpoint,
+except the AC feedback, which follows the replayed AC state.
+Both steps are a handful of indexed queries, so a home restores in
+milliseconds.
+"""
+import json
+import random
+import struct
+
+import database as db
+
+SENSORS = ("temperature_sensor", "pir_sensor", "ldr_sensor")
+_MT_STATE = struct.Struct("<625I")  # Mersenne Twister state words of random.Random
+
+
+def _rng_blob(room_sensors):
+    """The RNG states of a seeded room's sensors, or None if they use the global random module."""
+    rngs = [getattr(room_sensors, name)._rng for name in SENSORS]
+    if not all(isinstance(rng, random.Random) for rng in rngs):
+        return None
+    return b"".join(_MT_STATE.pack(*rng.getstate()[1]) for rng in rngs)
+
+
+def _restore_rngs(room_sensors, blob):
+    for index, name in enumerate(SENSORS):
+        words = _MT_STATE.unpack_from(blob, index * _MT_STATE.size)
+        getattr(room_sensors, name)._rng.setstate((3, words, None))
+
+
+def snapshot_room(room_sensors, controller):
+    """(state JSON, RNG blob or None) of one room's controller and sensors."""
+    temperature, pir = room_sensors.temperature_sensor, room_sensors.pir_sensor
+    state = {
+        "ac": controller.ac.state,
+        "light": controller.lights.state,
+        "temp": controller.current_temp,
+        "occupied": controller.is_occupied,
+        "light_level": controller.current_light_level,
+        "ac_override": controller.manual_ac_override,
+        "light_override": controller.manual_light_override,
+        "ac_on": temperature._ac_on,
+        "cooling_offset": temperature._ac_cooling_offset,
+        "pir_occupied": pir.is_occupied,
+        "pir_dwell": pir.readings_until_reevaluate,
+    }
+    return json.dumps(state, separators=(",", ":")), _rng_blob(room_sensors)
+
+
+def restore_room(room_sensors, controller, state, rng=None):
+    """Applies a snapshot_room() snapshot (state as JSON or dict)."""
+    if isinstance(state, str):
+        state = json.loads(state)
+    controller.ac.state = state["ac"]
+    controller.lights.state = state["light"]
+    controller.current_temp = state["temp"]
+    controller.is_occupied = state["occupied"]
+    controller.current_light_level = state["light_level"]
+    controller.manual_ac_override = state["ac_override"]
+    controller.manual_light_override = state["light_override"]
+    room_sensors.temperature_sensor._ac_on = state["ac_on"]
+    room_sensors.temperature_sensor._ac_cooling_offset = state["cooling_offset"]
+    room_sensors.pir_sensor.is_occupied = state["pir_occupied"]
+    room_sensors.pir_sensor.readings_until_reevaluate = state["pir_dwell"]
+    if rng is not None and _rng_blob(room_sensors) is not None:
+        _restore_rngs(room_sensors, rng)
+
+
+def load_checkpoints(room_ids=None):
+    """{room_id: (version, step, state JSON, rng)} of the current database."""
+    db.flush_pending_writes()
+    conn = db.get_connection()
+    if room_ids is None:
+        rows = conn.execute("SELECT room_id, version, step, state, rng FROM room_state").fetchall()
+    else:
+        room_ids = list(room_ids)
+        rows = conn.execute(
+            f"SELECT room_id, version, step, state, rng FROM room_state WHERE room_id IN ({','.join('?' * len(room_ids))})",
+            room_ids).fetchall()
+    return {row[0]: row[1:] for row in rows}
+
+
+def save_checkpoints(sensors, controllers, steps, versions):
+    """
+    Checkpoints the rooms in steps ({room_id: last step ticked}) to the
+    current database; versions ({room_id: version}) is bumped for each.
+    """
+    rows = []
+    for room_id, step in steps.items():
+        versions[room_id] = versions.get(room_id, 0) + 1
+        state, rng = snapshot_room(sensors[room_id], controllers[room_id])
+        rows.append((room_id, versions[room_id], step, state, rng))
+    if rows:
+        db.save_room_states(rows)
+
+
+# Series replayed into the controller: (table, series column, series, value column)
+REPLAYED_SERIES = (
+    ("appliance_log", "appliance", "AC", "state"),
+    ("appliance_log", "appliance", "Light", "state"),
+    ("sensor_log", "sensor_type", "temperature", "value"),
+    ("sensor_log", "sensor_type", "pir", "value"),
+    ("sensor_log", "sensor_type", "ldr", "value"),
+)
+
+
+def _apply(room_sensors, controller, series, value):
+    if series == "AC":
+        controller.ac.state = value
+        room_sensors.temperature_sensor.set_ac_state(value == "COOLING")
+    elif series == "Light":
+        controller.lights.state = value
+    elif series == "temperature":
+        controller.current_temp = value
+    elif series == "pir":
+        controller.is_occupied = room_sensors.pir_sensor.is_occupied = bool(value)
+    else:
+        controller.current_light_level = int(value)
+
+
+def replay_logs(sensors, controllers, since_ms):
+    """
+    Brings controllers up to the logs of the current database: each room's
+    newest AC and light states and sensor readings logged after
+    since_ms[room_id] (None or missing: ever). One index seek per series.
+    Returns {room_id: step of the newest row replayed} for the rooms that had any.
+    """
+    db.flush_pending_writes()
+    conn = db.get_connection()
+    replayed = {}
+    for room_id, controller in controllers.items():
+        after = since_ms.get(room_id)
+        for table, column, series, value_column in REPLAYED_SERIES:
+            row = conn.execute(f'''
+                SELECT {value_column}, timestamp FROM {table}
+                WHERE room_id = ? AND {column} = ? AND timestamp > ?
+                ORDER BY timestamp DESC, id DESC LIMIT 1''',
+                (room_id, series, -1 if after is None else after)).fetchone()
+            if row is not None:
+                _apply(sensors[room_id], controller, series, row[0])
+                replayed[room_id] = max(replayed.get(room_id, -1), db.ms_to_step(row[1]))
+    return replayed
+
+
+def restore_rooms(sensors, controllers, room_ids=None):
+    """
+    Restores rooms of the current database (default: all) from their
+    checkpoints, then replays the logs written after them.
+    Returns ({room_id: last step}, {room_id: checkpoint version}).
+    """
+    room_ids = list(controllers) if room_ids is None else list(room_ids)
+    checkpoints = load_checkpoints(room_ids)
+    steps, versions, since_ms = {}, {}, {}
+    for room_id in room_ids:
+        checkpoint = checkpoints.get(room_id)
+        if checkpoint is None:
+            since_ms[room_id] = None
+            continue
+        version, step, state, rng = checkpoint
+        restore_room(sensors[room_id], controllers[room_id], state, rng)
+        steps[room_id], versions[room_id] = step, version
+        since_ms[room_id] = db.step_to_ms(step)
+    for room_id, step in replay_logs(sensors, {room_id: controllers[room_id] for room_id in room_ids},
+                                     since_ms).items():
+        steps[room_id] = max(step, steps.get(room_id, -1))
+    return steps, versions
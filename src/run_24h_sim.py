@@ -1,13 +1,28 @@
-import requests
+"""
+24-hour simulation testbench.
+
+By default the simulation runs headless, in-process (see simulation.py), with
+no server needed. --http drives a running app.py through /api/tick instead,
+one request per room per step; start the server with SHEMS_SEED=<seed> and
+pass the same --seed to compare the two paths.
+
+Usage:
+    python src/run_24h_sim.py
+    python src/run_24h_sim.py --days 7 --rooms 20 --seed 42 --reset
+    python src/run_24h_sim.py --http
+"""
+import argparse
 import time
 
 BASE_URL = "http://127.0.0.1:5000/api"
 
 def start_simulation():
+    import requests
+
     print("--- Starting 288-Step High-Fidelity Simulation ---")
-    
+
     rooms = ["Living Room", "Bedroom", "Kitchen", "Study"]
-    
+
     # 288 steps = 24 hours of 5-minute intervals
     for step in range(288):
         for room in rooms:
@@ -15,10 +30,10 @@ def start_simulation():
                 "step": step,
                 "room_id": room
             })
-            
+
             if response.status_code != 200:
                 print(f"Error at step {step} for {room}: {response.text}")
-                
+
         # Print a progress update every hour (every 12 steps)
         if step % 12 == 0:
             print(f"Simulating Hour {step // 12} completed...")
@@ -28,5 +43,43 @@ def start_simulation():
     energy_res = requests.get(f"{BASE_URL}/energy")
     print(energy_res.json())
 
+def run_headless(days=1, num_rooms=4, seed=None, reset=False):
+    """Runs the simulation in-process and prints the /api/energy-shaped summary."""
+    import database as db
+    from simulation import SimulationEngine, rooms_config_for, STEPS_PER_DAY
+
+    db.init_db()
+    if reset:
+        db.reset_db()
+
+    engine = SimulationEngine(rooms_config_for(num_rooms), seed=seed)
+    print(f"--- Starting headless simulation: {days} day(s) x {num_rooms} room(s) ---")
+    start = time.perf_counter()
+    try:
+        summary = engine.run(days, progress=lambda day: print(f"Simulating Day {day} completed..."))
+    finally:
+        engine.close()
+    elapsed = time.perf_counter() - start
+
+    ticks = days * STEPS_PER_DAY * num_rooms
+    print(f"{ticks:,} room ticks in {elapsed:.2f}s ({ticks / elapsed:,.0f} ticks/s)")
+    print("\n--- VERIFIED CHAPTER 3 RESULTS ---")
+    print(summary)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=1, help="simulated days (288 steps each)")
+    parser.add_argument("--rooms", type=int, default=4, help="number of rooms (beyond 4, 'Room N' copies)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible runs")
+    parser.add_argument("--reset", action="store_true", help="clear all logs before running")
+    parser.add_argument("--http", action="store_true", help="drive a running app.py over HTTP instead")
+    args = parser.parse_args()
+
+    if args.http:
+        start_simulation()
+    else:
+        run_headless(args.days, args.rooms, args.seed, args.reset)
+
 if __name__ == "__main__":
-    start_simulation()
\ No newline at end of file
+    main()
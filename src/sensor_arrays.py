@@ -0,0 +1,144 @@
+"""
+Vectorized sensor layer: the TemperatureSensor, PIRSensor and LDRSensor models
+of sensors.py for many rooms at once, held as NumPy arrays.
+
+One SensorArray read advances every room by one reading; read_many advances
+them through a whole sequence of simulated hours (a day, or many days) and
+returns (steps x rooms) arrays. The stateful parts follow the scalar classes
+reading for reading:
+- the AC cooling offset rises by 0.3 °C per reading while the room's AC is on
+  (up to 6 °C) and recovers by 0.2 °C per reading while it is off; the AC
+  feedback comes from set_ac_state() or a per-step ac_on schedule
+- the PIR dwell counter: an occupied room stays occupied for 2-8 readings,
+  an empty room re-evaluates every other reading
+
+Readings are not sent to observers and noise comes from a seeded
+numpy.random.Generator, so values match the scalar sensors in distribution,
+not draw for draw. Fed the same draws, both read exactly alike
+(tests/test_sensor_arrays.py).
+"""
+import numpy as np
+
+# Same constants as sensors.py
+TEMP_AMPLITUDE = 5.0
+MIN_TEMP, MAX_TEMP = 15.0, 45.0
+AC_COOLING_RATE = 0.3   # °C decrease per reading while AC is on
+AC_RECOVERY_RATE = 0.2  # °C recovered per reading while AC is off
+AC_MAX_COOLING = 6.0
+MIN_BRIGHTNESS, MAX_BRIGHTNESS = 0, 1023
+
+
+def occupancy_probability(simulated_hours):
+    """PIRSensor._get_occupancy_probability over an array of hours."""
+    hour = np.asarray(simulated_hours, dtype=float) % 24
+    return np.where((hour >= 22) | (hour < 6), 0.10,
+                    np.where(hour < 17, 0.20, 0.80))
+
+
+def daylight(simulated_hours, noise):
+    """LDRSensor.read over an array of hours, given uniform(-1, 1) noise of the same shape."""
+    hour = np.asarray(simulated_hours, dtype=float) % 24
+    dark = (hour < 6) | (hour > 18)
+    curve = (np.cos((hour - 12) * np.pi / 6) + 1) / 2 * MAX_BRIGHTNESS
+    brightness = np.where(dark, MIN_BRIGHTNESS + noise * 10, curve + noise * 30)
+    return np.clip(brightness, MIN_BRIGHTNESS, MAX_BRIGHTNESS).astype(np.int64)
+
+
+class SensorArray:
+    """
+    Temperature, PIR and LDR sensors for len(base_temps) rooms.
+    Room i has base temperature base_temps[i] and name room_names[i].
+    """
+
+    def __init__(self, base_temps, room_names=None, seed=None):
+        self.base_temps = np.asarray(base_temps, dtype=float)
+        n = len(self.base_temps)
+        self.room_names = list(room_names) if room_names is not None else [f"Room {i + 1}" for i in range(n)]
+        self.rng = np.random.default_rng(seed)
+        self.ac_on = np.zeros(n, dtype=bool)
+        self.ac_cooling_offset = np.zeros(n)
+        self.is_occupied = np.zeros(n, dtype=bool)
+        self.readings_until_reevaluate = np.zeros(n, dtype=np.int64)
+
+    @classmethod
+    def from_config(cls, rooms_config, seed=None):
+        """Builds the array from a {room_name: base_temp} mapping such as simulation.ROOMS_CONFIG."""
+        return cls(list(rooms_config.values()), list(rooms_config), seed)
+
+    def __len__(self):
+        return len(self.base_temps)
+
+    def set_ac_state(self, on):
+        """AC state per room (bool array, or one bool for all rooms), applied from the next reading."""
+        self.ac_on = np.broadcast_to(np.asarray(on, dtype=bool), self.ac_on.shape).copy()
+
+    def _read_temperature(self, simulated_hour, ac_on, noise):
+        self.ac_cooling_offset = np.where(
+            ac_on,
+            np.minimum(self.ac_cooling_offset + AC_COOLING_RATE, AC_MAX_COOLING),
+            np.maximum(self.ac_cooling_offset - AC_RECOVERY_RATE, 0.0))
+        temp = self.base_temps + TEMP_AMPLITUDE * np.sin((simulated_hour - 14) * np.pi / 12)
+        temp = temp - self.ac_cooling_offset + noise
+        return np.round(np.clip(temp, MIN_TEMP, MAX_TEMP), 2)
+
+    def _read_pir(self, probability, draws, dwell):
+        reevaluate = self.readings_until_reevaluate <= 0
+        occupied = draws < probability
+        self.is_occupied = np.where(reevaluate, occupied, self.is_occupied)
+        self.readings_until_reevaluate = np.where(
+            reevaluate, np.where(occupied, dwell, 1), self.readings_until_reevaluate - 1)
+        return self.is_occupied.astype(np.int64)
+
+    def read(self, simulated_hour):
+        """
+        One reading for every room at simulated_hour.
+        Returns {'temperature', 'occupancy', 'light_level'} arrays of shape (rooms,).
+        """
+        n = len(self)
+        return {
+            'temperature': self._read_temperature(simulated_hour, self.ac_on, self.rng.uniform(-0.5, 0.5, n)),
+            'occupancy': self._read_pir(occupancy_probability(simulated_hour),
+                                        self.rng.random(n), self.rng.integers(2, 9, n)),
+            'light_level': daylight(np.full(n, simulated_hour), self.rng.uniform(-1, 1, n)),
+        }
+
+    def read_many(self, simulated_hours, ac_on=None):
+        """
+        Consecutive readings for every room, one per entry of simulated_hours.
+        ac_on, if given, is a (steps x rooms) bool schedule of the AC state at
+        each reading (the controller feedback); otherwise the current
+        set_ac_state() value holds throughout. The AC state after the last
+        reading is kept for the next call.
+        Returns {'temperature', 'occupancy', 'light_level'} arrays of shape (steps, rooms).
+        """
+        hours = np.asarray(simulated_hours, dtype=float)
+        shape = (len(hours), len(self))
+        if ac_on is None:
+            ac_on = np.broadcast_to(self.ac_on, shape)
+        else:
+            ac_on = np.asarray(ac_on, dtype=bool)
+            if ac_on.shape != shape:
+                raise ValueError(f"ac_on must have shape {shape}, got {ac_on.shape}")
+
+        # Everything that does not depend on earlier readings is computed for the whole grid
+        temp_noise = self.rng.uniform(-0.5, 0.5, shape)
+        pir_draws = self.rng.random(shape)
+        pir_dwell = self.rng.integers(2, 9, shape)
+        probability = occupancy_probability(hours)
+        light = daylight(np.broadcast_to(hours[:, None], shape), self.rng.uniform(-1, 1, shape))
+
+        # The cooling offset and the dwell counter carry over from reading to reading
+        temperature = np.empty(shape)
+        occupancy = np.empty(shape, dtype=np.int64)
+        for t, hour in enumerate(hours):
+            temperature[t] = self._read_temperature(hour, ac_on[t], temp_noise[t])
+            occupancy[t] = self._read_pir(probability[t], pir_draws[t], pir_dwell[t])
+        if len(hours):
+            self.ac_on = ac_on[-1].copy()
+
+        return {'temperature': temperature, 'occupancy': occupancy, 'light_level': light}
+
+
+def hours_for_steps(start_step, num_steps):
+    """Simulated hours of num_steps consecutive 5-minute steps, as tick_room computes them."""
+    return np.arange(start_step, start_step + num_steps) * 5 / 60.0
@@ -6,9 +6,11 @@ Implements Observer pattern for sensor notifications and multiple sensor types
 import math
 import random
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 
+import metrics
+
 
 class SensorSubject:
     """
@@ -29,6 +31,7 @@ class SensorSubject:
         if observer in self._observers:
             self._observers.remove(observer)
     
+    @metrics.instrumented("observer_fanout", metrics.SAMPLE_EVERY)
     def notify_observers(self, sensor_data: Dict[str, Any]) -> None:
         """Notify all registered observers of sensor data."""
         for observer in self._observers:
@@ -60,17 +63,20 @@ class TemperatureSensor(SensorSubject):
     Range: 15–45°C
     """
     
-    def __init__(self, base_temp: float = 20.0, room_name: str = "Unknown"):
+    def __init__(self, base_temp: float = 20.0, room_name: str = "Unknown",
+                 rng: Optional[random.Random] = None):
         """
         Initialize temperature sensor.
         
         Args:
             base_temp: Base temperature for the room (default 20°C)
             room_name: Name of the room this sensor is in
+            rng: Random source for noise (default: the global random module)
         """
         super().__init__()
         self.base_temp = base_temp
         self.room_name = room_name
+        self._rng = rng if rng is not None else random
         self.min_temp = 15.0
         self.max_temp = 45.0
         self._ac_on = False
@@ -110,7 +116,7 @@ class TemperatureSensor(SensorSubject):
         temp -= self._ac_cooling_offset
         
         # Add random noise (±0.5°C)
-        noise = random.uniform(-0.5, 0.5)
+        noise = self._rng.uniform(-0.5, 0.5)
         temp += noise
         
         # Clamp to valid range
@@ -153,15 +159,17 @@ class PIRSensor(SensorSubject):
     before re-evaluating occupancy probability.
     """
     
-    def __init__(self, room_name: str = "Unknown"):
+    def __init__(self, room_name: str = "Unknown", rng: Optional[random.Random] = None):
         """
         Initialize PIR sensor.
         
         Args:
             room_name: Name of the room this sensor is in
+            rng: Random source for occupancy (default: the global random module)
         """
         super().__init__()
         self.room_name = room_name
+        self._rng = rng if rng is not None else random
         self.is_occupied = False
         self.readings_until_reevaluate = 0
     
@@ -175,6 +183,7 @@ class PIRSensor(SensorSubject):
         Returns:
             Probability of occupancy (0.0-1.0)
         """
+        simulated_hour %= 24  # multi-day runs pass hours past 24
         if 22 <= simulated_hour or simulated_hour < 6:  # 10PM-6AM
             return 0.10
         elif 6 <= simulated_hour < 17:  # 6AM-5PM (work hours)
@@ -195,11 +204,11 @@ class PIRSensor(SensorSubject):
         # If we need to re-evaluate occupancy
         if self.readings_until_reevaluate <= 0:
             probability = self._get_occupancy_probability(simulated_hour)
-            self.is_occupied = random.random() < probability
+            self.is_occupied = self._rng.random() < probability
             
             # If occupied, stay occupied for 2-8 readings (10-40 minutes)
             if self.is_occupied:
-                self.readings_until_reevaluate = random.randint(2, 8)
+                self.readings_until_reevaluate = self._rng.randint(2, 8)
             else:
                 # If empty, re-evaluate next reading
                 self.readings_until_reevaluate = 1
@@ -232,15 +241,17 @@ class LDRSensor(SensorSubject):
     Adds realistic noise.
     """
     
-    def __init__(self, room_name: str = "Unknown"):
+    def __init__(self, room_name: str = "Unknown", rng: Optional[random.Random] = None):
         """
         Initialize LDR sensor.
         
         Args:
             room_name: Name of the room this sensor is in
+            rng: Random source for noise (default: the global random module)
         """
         super().__init__()
         self.room_name = room_name
+        self._rng = rng if rng is not None else random
         self.min_brightness = 0
         self.max_brightness = 1023
     
@@ -256,19 +267,20 @@ class LDRSensor(SensorSubject):
         """
         # Daylight curve: peaks at 12 (noon), dark before 6AM and after 6PM
         # Using cosine for smooth curve
+        hour_of_day = simulated_hour % 24  # multi-day runs pass hours past 24
         
-        if simulated_hour < 6 or simulated_hour > 18:
+        if hour_of_day < 6 or hour_of_day > 18:
             # Dark period (before 6AM or after 6PM)
-            brightness = self.min_brightness + random.uniform(-10, 10)
-        elif 6 <= simulated_hour <= 18:
+            brightness = self.min_brightness + self._rng.uniform(-10, 10)
+        elif 6 <= hour_of_day <= 18:
             # Daylight period
             # Cosine peaks at 12, is 0 at 6 and 18
-            cosine_component = math.cos((simulated_hour - 12) * math.pi / 6)
+            cosine_component = math.cos((hour_of_day - 12) * math.pi / 6)
             # Map from [-1, 1] to [0, 1023]
             brightness = (cosine_component + 1) / 2 * self.max_brightness
             
             # Add noise
-            noise = random.uniform(-30, 30)
+            noise = self._rng.uniform(-30, 30)
             brightness += noise
         else:
             brightness = self.min_brightness
@@ -296,18 +308,26 @@ class RoomSensors:
     Provides a unified interface to read all sensors at once.
     """
     
-    def __init__(self, room_name: str, base_temp: float = 20.0):
+    def __init__(self, room_name: str, base_temp: float = 20.0, seed: Optional[int] = None):
         """
         Initialize all sensors for a room.
         
         Args:
             room_name: Name of the room
             base_temp: Base temperature for the room
+            seed: If given, each sensor gets its own random.Random seeded from
+                  (seed, room_name, sensor type), so the room's readings do not
+                  depend on any other room or on the global random state
         """
         self.room_name = room_name
-        self.temperature_sensor = TemperatureSensor(base_temp, room_name)
-        self.pir_sensor = PIRSensor(room_name)
-        self.ldr_sensor = LDRSensor(room_name)
+        self.temperature_sensor = TemperatureSensor(base_temp, room_name, self._sensor_rng(seed, 'temperature'))
+        self.pir_sensor = PIRSensor(room_name, self._sensor_rng(seed, 'pir'))
+        self.ldr_sensor = LDRSensor(room_name, self._sensor_rng(seed, 'ldr'))
+
+    def _sensor_rng(self, seed: Optional[int], sensor_type: str) -> Optional[random.Random]:
+        if seed is None:
+            return None
+        return random.Random(f"{seed}:{self.room_name}:{sensor_type}")
     
     def register_observer(self, observer: SensorObserver) -> None:
         """
@@ -320,6 +340,7 @@ class RoomSensors:
         self.pir_sensor.register_observer(observer)
         self.ldr_sensor.register_observer(observer)
     
+    @metrics.instrumented("sensor_read", metrics.SAMPLE_EVERY)
     def read_all(self, simulated_hour: float) -> Dict[str, Any]:
         """
         Read all sensors for this room.
@@ -0,0 +1,155 @@
+"""
+Headless simulation engine for SHEMS.
+Wires RoomSensors, RoomController and the DataLogger together in-process, so a
+run does not pay for an HTTP round trip, JSON and a commit per tick. The
+per-room tick (tick_room) is the same function /api/tick calls, so for the same
+seed the engine and the HTTP path log identical data.
+"""
+import json
+
+import database as db
+import metrics
+from control import RoomController
+from sensors import RoomSensors
+
+# The 4 rooms with their specific base temperatures
+ROOMS_CONFIG = {
+    "Living Room": 25.0,
+    "Bedroom": 27.0,
+    "Kitchen": 30.0,
+    "Study": 28.0
+}
+
+STEPS_PER_DAY = 288  # 5-minute steps
+BASELINE_KWH_PER_ROOM_DAY = 36.72  # Chapter 3 baseline, per room per 24 h
+
+
+def rooms_config_for(num_rooms):
+    """ROOMS_CONFIG extended with 'Room N' entries (cycling base temps) up to num_rooms rooms."""
+    names = list(ROOMS_CONFIG)
+    config = {}
+    for i in range(num_rooms):
+        if i < len(names):
+            config[names[i]] = ROOMS_CONFIG[names[i]]
+        else:
+            config[f"Room {i + 1}"] = ROOMS_CONFIG[names[i % len(names)]]
+    return config
+
+
+def load_rooms_config(spec=None):
+    """
+    Room setup from configuration: None for ROOMS_CONFIG, a room count (int or
+    digit string) for rooms_config_for(n), or the path of a JSON file mapping
+    room names to base temperatures.
+    """
+    if spec is None or spec == "":
+        return dict(ROOMS_CONFIG)
+    if isinstance(spec, int) or str(spec).isdigit():
+        return rooms_config_for(int(spec))
+    with open(spec) as f:
+        return {str(name): float(base_temp) for name, base_temp in json.load(f).items()}
+
+
+def build_rooms(rooms_config, logger, seed=None):
+    """
+    Creates a controller and sensor bundle per room, with the controller and
+    logger observing the sensors. With a seed every sensor gets its own RNG
+    (see RoomSensors), so runs are reproducible and independent of each other.
+    """
+    controllers = {}
+    sensors = {}
+    for room_name, base_temp in rooms_config.items():
+        controllers[room_name] = RoomController(room_name)
+        sensors[room_name] = RoomSensors(room_name, base_temp=base_temp, seed=seed)
+        sensors[room_name].register_observer(controllers[room_name])
+        sensors[room_name].register_observer(logger)
+    return controllers, sensors
+
+
+@metrics.instrumented("tick", metrics.SAMPLE_EVERY)
+def tick_room(room_sensors, controller, room_id, step):
+    """Reads one room's sensors for a step, evaluates its FSMs and logs transitions."""
+    # Convert step (5 min increments) to fractional hours for Ridwanullah's sensors
+    simulated_hour = step * 5 / 60.0
+
+    room_sensors.read_all(simulated_hour)
+    ac_state, light_state = controller.evaluate_state()
+    # Feed the AC decision back so the room cools while it runs
+    room_sensors.temperature_sensor.set_ac_state(ac_state == "COOLING")
+
+    db.log_appliance_state(room_id, "AC", ac_state, ac_state == "COOLING", step)
+    db.log_appliance_state(room_id, "Light", light_state, light_state == "ON", step)
+    return ac_state, light_state
+
+
+def tick_range(sensors, controllers, room_ids, steps):
+    """
+    Ticks room_ids, in the given order, for each step in order.
+    Yields (step, [(ac_state, light_state) per room]) after each step.
+    """
+    rooms = [(room_id, sensors[room_id], controllers[room_id]) for room_id in room_ids]
+    for step in steps:
+        yield step, [tick_room(room_sensors, controller, room_id, step)
+                     for room_id, room_sensors, controller in rooms]
+
+
+def energy_analysis(actual_total, baseline_total):
+    """Savings block of the /api/energy response."""
+    saved_kwh = baseline_total - actual_total
+    savings_percentage = (saved_kwh / baseline_total) * 100 if baseline_total > 0 else 0
+    return {
+        "baseline_kwh": baseline_total,
+        "actual_kwh": actual_total,
+        "saved_kwh": round(saved_kwh, 2),
+        "savings_percentage": round(savings_percentage, 1)
+    }
+
+
+class SimulationEngine:
+    """
+    Runs days x rooms of simulation in-process.
+
+    Appliance transitions are committed once per simulated day
+    (database.appliance_write_batch) and that day's sensor readings are then
+    written by one DataLogger flush, so the run is bound by the sensor and FSM
+    maths rather than by SQLite commits.
+    """
+    def __init__(self, rooms_config=None, seed=None):
+        self.rooms_config = dict(rooms_config or ROOMS_CONFIG)
+        self.seed = seed
+        # Flushed by run() once per day, after that day's appliance batch commits
+        self.logger = db.DataLogger(buffered=True, batch_size=float("inf"), flush_interval=float("inf"))
+        self.controllers, self.sensors = build_rooms(self.rooms_config, self.logger, seed)
+        self.next_step = 0
+
+    def run(self, days=1, progress=None):
+        """
+        Advances every room through days x STEPS_PER_DAY steps, continuing from
+        where the previous run() stopped. progress, if given, is called with
+        each completed day number. Returns the energy summary.
+        """
+        for _ in range(days):
+            steps = range(self.next_step, self.next_step + STEPS_PER_DAY)
+            with db.appliance_write_batch():
+                for _ in tick_range(self.sensors, self.controllers, self.rooms_config, steps):
+                    pass
+            self.logger.flush()
+            self.next_step += STEPS_PER_DAY
+            if progress is not None:
+                progress(self.next_step // STEPS_PER_DAY)
+
+        return self.summary()
+
+    def summary(self):
+        """Energy totals for the steps run so far, in the /api/energy response shape."""
+        energy_data = db.calculate_total_energy()
+        days = self.next_step / STEPS_PER_DAY
+        baseline_total = round(BASELINE_KWH_PER_ROOM_DAY * len(self.rooms_config) * days, 2)
+        return {
+            "data": energy_data,
+            "analysis": energy_analysis(energy_data.get("total_kwh", 0), baseline_total)
+        }
+
+    def close(self):
+        """Writes any buffered readings and releases the logger's connection."""
+        self.logger.close()
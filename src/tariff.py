@@ -0,0 +1,136 @@
+"""
+Time-of-use tariff engine for SHEMS.
+
+A Tariff is a set of daily bands (name, start hour, end hour, ₦/kWh) that
+together cover the 24 hours of a day; a band may wrap past midnight
+(e.g. 22 -> 6). price_intervals() splits every ON interval at the band
+boundaries and prices each piece, vectorized over all intervals: the time an
+interval [s, e) spends in a band is F(e) - F(s), where F(t) is the band time
+elapsed since the epoch, so intervals spanning many days need no loop.
+Timestamps are read as simulated local time, like the rest of SHEMS.
+
+Schedules load from JSON:
+    {"name": "TOU", "bands": [
+        {"name": "off-peak", "start_hour": 22, "end_hour": 6, "rate": 45},
+        {"name": "standard", "start_hour": 6, "end_hour": 17, "rate": 68},
+        {"name": "peak", "start_hour": 17, "end_hour": 22, "rate": 95}]}
+"""
+import json
+
+import numpy as np
+
+import database as db
+
+MS_PER_DAY = 24 * db.MS_PER_HOUR
+
+
+class Tariff:
+    """Daily time-of-use bands: [(name, start_hour, end_hour, rate_ngn_per_kwh), ...]."""
+
+    def __init__(self, bands, name="Custom"):
+        self.name = name
+        self.bands = [(str(b_name), float(start), float(end), float(rate)) for b_name, start, end, rate in bands]
+        # Each band as one or two non-wrapping [start_ms, end_ms) windows within a day
+        self._windows = []
+        covered = 0.0
+        for index, (b_name, start, end, rate) in enumerate(self.bands):
+            if not (0 <= start < 24 and 0 <= end <= 24) or start == end:
+                raise ValueError(f"Band {b_name!r}: hours must be in [0, 24] with start != end")
+            spans = [(start, end)] if start < end else [(start, 24.0), (0.0, end)]
+            for lo, hi in spans:
+                if hi > lo:
+                    self._windows.append((index, lo * db.MS_PER_HOUR, hi * db.MS_PER_HOUR))
+                    covered += hi - lo
+        hours = sorted((lo, hi) for _, lo, hi in self._windows)
+        if abs(covered - 24) > 1e-9 or any(a[1] > b[0] for a, b in zip(hours, hours[1:])):
+            raise ValueError("Tariff bands must cover the whole day exactly once")
+
+    @classmethod
+    def flat(cls, rate, name="Flat"):
+        return cls([(name, 0, 24, rate)], name)
+
+    @classmethod
+    def from_dict(cls, config):
+        bands = [(b["name"], b["start_hour"], b["end_hour"], b["rate"]) for b in config["bands"]]
+        return cls(bands, config.get("name", "Custom"))
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        return {"name": self.name, "bands": [
+            {"name": b_name, "start_hour": start, "end_hour": end, "rate": rate}
+            for b_name, start, end, rate in self.bands]}
+
+    @property
+    def band_names(self):
+        return [band[0] for band in self.bands]
+
+    def band_hours(self, start_ms, end_ms):
+        """(intervals x bands) array of the hours each [start_ms, end_ms) interval spends in each band."""
+        start_ms = np.asarray(start_ms, dtype=np.int64)
+        end_ms = np.asarray(end_ms, dtype=np.int64)
+        out = np.zeros((len(start_ms), len(self.bands)))
+        for index, lo, hi in self._windows:
+            width = hi - lo
+
+            def elapsed(t):
+                return (t // MS_PER_DAY) * width + np.clip(t % MS_PER_DAY - lo, 0, width)
+
+            out[:, index] += (elapsed(end_ms) - elapsed(start_ms)) / db.MS_PER_HOUR
+        return out
+
+    def price_intervals(self, start_ms, end_ms, kw):
+        """
+        Splits each interval at the band boundaries.
+        Returns (kwh, ngn) arrays of shape (intervals x bands).
+        """
+        kwh = self.band_hours(start_ms, end_ms) * np.asarray(kw, dtype=float)[:, None]
+        rates = np.array([band[3] for band in self.bands])
+        return kwh, kwh * rates
+
+
+def _sum_by(labels, values):
+    """{label: {"kwh", "ngn"}} summed over rows; values is a (kwh, ngn) pair of row arrays."""
+    names, inverse = np.unique(labels, return_inverse=True)
+    kwh = np.bincount(inverse, weights=values[0], minlength=len(names))
+    ngn = np.bincount(inverse, weights=values[1], minlength=len(names))
+    return {str(name): {"kwh": round(float(k), 4), "ngn": round(float(c), 2)}
+            for name, k, c in zip(names, kwh, ngn)}
+
+
+def _by_band(tariff, kwh, ngn):
+    return {name: {"kwh": round(float(kwh[:, b].sum()), 4), "ngn": round(float(ngn[:, b].sum()), 2)}
+            for b, name in enumerate(tariff.band_names)}
+
+
+def cost_breakdown(intervals, tariff):
+    """
+    Prices ON intervals given as (room_id, appliance, start_ms, end_ms, kw) rows.
+    Returns {"tariff", "total_kwh", "total_ngn", "by_band", "by_appliance", "by_room"};
+    every group is {"kwh", "ngn"}, and each by_room entry also has its own
+    "by_appliance" and "by_band".
+    """
+    rooms = np.array([row[0] for row in intervals], dtype=str)
+    appliances = np.array([row[1] for row in intervals], dtype=str)
+    start = np.array([row[2] for row in intervals], dtype=np.int64)
+    end = np.array([row[3] for row in intervals], dtype=np.int64)
+    kw = np.array([row[4] for row in intervals], dtype=float)
+    kwh, ngn = tariff.price_intervals(start, end, kw)
+    totals = (kwh.sum(axis=1), ngn.sum(axis=1))
+
+    by_room = _sum_by(rooms, totals)
+    for room, entry in by_room.items():
+        mask = rooms == room
+        entry["by_appliance"] = _sum_by(appliances[mask], (totals[0][mask], totals[1][mask]))
+        entry["by_band"] = _by_band(tariff, kwh[mask], ngn[mask])
+    return {
+        "tariff": tariff.to_dict(),
+        "total_kwh": round(float(kwh.sum()), 4),
+        "total_ngn": round(float(ngn.sum()), 2),
+        "by_band": _by_band(tariff, kwh, ngn),
+        "by_appliance": _sum_by(appliances, totals),
+        "by_room": by_room,
+    }
@@ -0,0 +1,87 @@
+"""Archiving a day must keep every reading exactly once, across reruns and resets."""
+import contextlib
+import io
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import archive
+import database as db
+from simulation import STEPS_PER_DAY
+
+DAYS = 3
+
+
+@pytest.fixture
+def shard(tmp_path, monkeypatch):
+    # archive.ARCHIVE_DIR is relative, as reset_db() uses it
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "shard.db")
+    with db.using_database(path):
+        db.init_db()
+        yield path
+    db.release_database(path)
+
+
+def _log(value, first_step=0):
+    """One temperature reading per simulated hour from first_step, all of them `value`."""
+    rows = [("Bedroom", "temperature", value, db.step_to_ms(step))
+            for step in range(first_step, DAYS * STEPS_PER_DAY, 12)]
+    conn = db.get_connection()
+    with conn:
+        db.insert_sensor_rows(conn, rows)
+    return len(rows)
+
+
+def _archived_values():
+    return archive.read_sensor_log(room_id="Bedroom")["value"].to_pylist()
+
+
+def test_rerun_after_reset_archives_the_new_readings(shard):
+    _log(1.0)
+    assert archive.archive_closed_days()
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.reset_db()
+    assert _archived_values() == []
+
+    logged = _log(2.0)
+    assert archive.archive_closed_days()
+    assert _archived_values() == [2.0] * logged
+
+
+def test_pass_interrupted_before_its_delete_is_repeated_once(shard, monkeypatch):
+    logged = _log(1.0)
+    archive_day = archive._archive_day
+
+    class Interrupted(Exception):
+        pass
+
+    class NoDelete:
+        """The archive connection, failing where the day's rows would be deleted."""
+        def __init__(self, conn):
+            self._conn = conn
+
+        def execute(self, sql, *params):
+            if sql.startswith("DELETE"):
+                raise Interrupted
+            return self._conn.execute(sql, *params)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setattr(archive, "_archive_day", lambda conn, *args: archive_day(NoDelete(conn), *args))
+    with pytest.raises(Interrupted):
+        archive.archive_closed_days()
+    monkeypatch.setattr(archive, "_archive_day", archive_day)
+
+    assert archive.archive_closed_days()
+    assert len(_archived_values()) == logged
+
+    # Readings logged late for an archived day join its file on the next pass
+    late = _log(3.0, first_step=6)
+    assert archive.archive_closed_days()
+    assert sorted(_archived_values()) == [1.0] * logged + [3.0] * late
@@ -0,0 +1,67 @@
+"""FleetController must take the same decisions as one RoomController per room."""
+import numpy as np
+import pytest
+
+from control import RoomController
+from fleet_control import AC_STATES, LIGHT_STATES, FleetController
+
+ROOMS = 64
+STEPS = 500
+
+
+def _readings(seed):
+    """Random occupancy / temperature / light per (step, room), with readings on every threshold."""
+    rng = np.random.default_rng(seed)
+    occupied = rng.random((STEPS, ROOMS)) < 0.5
+    temp = np.round(rng.uniform(20.0, 32.0, (STEPS, ROOMS)), 2)
+    light = rng.integers(0, 1024, (STEPS, ROOMS))
+    temp[rng.random((STEPS, ROOMS)) < 0.05] = 28.0
+    temp[rng.random((STEPS, ROOMS)) < 0.05] = 24.0
+    light[rng.random((STEPS, ROOMS)) < 0.05] = 300
+    return occupied, temp, light
+
+
+def _scalar_step(controller, occupied, temp, light):
+    controller.update({'sensor_type': 'temperature', 'value': float(temp)})
+    controller.update({'sensor_type': 'pir', 'occupied': bool(occupied)})
+    controller.update({'sensor_type': 'ldr', 'value': int(light)})
+    return controller.evaluate_state()
+
+
+def _assert_same_step(step, fleet, codes, controllers, occupied, temp, light):
+    expected = [_scalar_step(controller, occupied[i], temp[i], light[i])
+                for i, controller in enumerate(controllers)]
+    actual = fleet.states(*codes)
+    for room, (want, got) in enumerate(zip(expected, actual)):
+        assert got == want, f"step {step}, room {room}: scalar {want}, fleet {got}"
+
+
+@pytest.mark.parametrize("seed", [0, 1, 42])
+def test_fleet_matches_scalar_controllers(seed):
+    occupied, temp, light = _readings(seed)
+    fleet = FleetController(ROOMS)
+    controllers = [RoomController(name) for name in fleet.room_names]
+    for step in range(STEPS):
+        codes = fleet.step(occupied[step], temp[step], light[step])
+        _assert_same_step(step, fleet, codes, controllers, occupied[step], temp[step], light[step])
+
+
+def test_fleet_matches_scalar_controllers_with_overrides():
+    occupied, temp, light = _readings(7)
+    fleet = FleetController(ROOMS)
+    controllers = [RoomController(name) for name in fleet.room_names]
+    rng = np.random.default_rng(7)
+    for step in range(STEPS):
+        if step % 50 == 0:
+            # Pin or release a few rooms; an overridden FSM must not advance in either
+            for room in rng.choice(ROOMS, 8, replace=False):
+                ac = rng.choice([None, *AC_STATES])
+                light_state = rng.choice([None, *LIGHT_STATES])
+                fleet.set_manual_override(int(room), ac=ac, light=light_state)
+                controllers[room].manual_ac_override = ac
+                controllers[room].manual_light_override = light_state
+        codes = fleet.step(occupied[step], temp[step], light[step])
+        _assert_same_step(step, fleet, codes, controllers, occupied[step], temp[step], light[step])
+        for room, controller in enumerate(controllers):
+            assert AC_STATES[fleet.ac_state[room]] == controller.ac.state
+            assert LIGHT_STATES[fleet.light_state[room]] == controller.lights.state
@@ -0,0 +1,59 @@
+"""A tick rejected by a full ingest queue must leave its room untouched, so a retry is safe."""
+import contextlib
+import io
+
+import pytest
+
+import database as db
+import room_state
+from homes import Home
+from ingestion import IngestQueue, IngestQueueFull
+from simulation import ROOMS_CONFIG
+
+ROOM = next(iter(ROOMS_CONFIG))
+STEPS = 6
+FULL_AT = 3
+
+
+def _run(tmp_path, name, fill):
+    """Ticks ROOM over STEPS; with fill, the queue is full at step FULL_AT and the tick is retried."""
+    path = str(tmp_path / f"{name}.db")
+    filler = str(tmp_path / f"{name}_filler.db")
+    with db.using_database(filler):
+        db.init_db()
+    ingest = IngestQueue(maxsize=64, put_timeout=0.05)
+    db.set_ingest_queue(ingest)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            home = Home("h", path, ROOMS_CONFIG, seed=3)
+            with home.database():
+                for step in range(STEPS):
+                    if fill and step == FULL_AT:
+                        # The writer is not running yet, so nothing leaves the queue
+                        while ingest.stats()["depth"] < ingest.maxsize:
+                            ingest.put("sensor", ("filler", "temperature", 0.0, 0), filler)
+                        before = room_state.snapshot_room(home.sensors[ROOM], home.controllers[ROOM])
+                        with pytest.raises(IngestQueueFull):
+                            home.tick(ROOM, step)
+                        assert room_state.snapshot_room(home.sensors[ROOM], home.controllers[ROOM]) == before
+                        ingest.start()
+                    home.tick(ROOM, step)
+                ingest.start()
+                assert db.flush_pending_writes()
+                conn = db.get_connection()
+                logs = (conn.execute("SELECT room_id, sensor_type, value, timestamp FROM sensor_log ORDER BY id").fetchall(),
+                        conn.execute("SELECT room_id, appliance, state, timestamp FROM appliance_log ORDER BY id").fetchall())
+                state = room_state.snapshot_room(home.sensors[ROOM], home.controllers[ROOM])
+    finally:
+        db.set_ingest_queue(None)
+        ingest.stop()
+        db.release_database(path)
+        db.release_database(filler)
+    return logs, state
+
+
+def test_rejected_tick_retries_like_a_clean_run(tmp_path):
+    clean = _run(tmp_path, "clean", fill=False)
+    retried = _run(tmp_path, "retried", fill=True)
+    assert retried[0][0], "no sensor rows were logged"
+    assert retried == clean
@@ -0,0 +1,117 @@
+"""SensorArray must read exactly like the scalar sensors of sensors.py when both get the same draws."""
+import numpy as np
+import pytest
+
+from sensor_arrays import SensorArray, hours_for_steps
+from sensors import LDRSensor, PIRSensor, TemperatureSensor
+
+BASE_TEMPS = [22.0, 24.0, 26.0, 28.0, 30.0]
+STEPS = 2 * 288  # two simulated days
+
+
+def _draws(seed, shape):
+    """The draws one reading of every room takes, in SensorArray.read's order."""
+    rng = np.random.default_rng(seed)
+    return [("uniform", rng.uniform(-0.5, 0.5, shape)),  # temperature noise
+            ("random", rng.random(shape)),               # PIR occupancy
+            ("integers", rng.integers(2, 9, shape)),     # PIR dwell
+            ("uniform", rng.uniform(-1, 1, shape))]      # LDR noise, scaled by the sensor
+
+
+class _ScriptedGenerator:
+    """Stands in for SensorArray.rng, handing out the given draws in order."""
+
+    def __init__(self):
+        self.draws = []
+
+    def _next(self, method):
+        expected, values = self.draws.pop(0)
+        assert method == expected, f"SensorArray drew {method}, expected {expected}"
+        return values
+
+    def uniform(self, low, high, size):
+        return self._next("uniform")
+
+    def random(self, size):
+        return self._next("random")
+
+    def integers(self, low, high, size):
+        return self._next("integers")
+
+
+class _ScriptedRandom:
+    """Stands in for one scalar sensor's random.Random, returning the current step's draws."""
+
+    def __init__(self):
+        self.uniform_unit = self.random_value = self.randint_value = None
+
+    def uniform(self, low, high):
+        # Both scalar noise ranges are symmetric: ±0.5 °C, and ±10 or ±30 for the LDR
+        return self.uniform_unit * high
+
+    def random(self):
+        return self.random_value
+
+    def randint(self, low, high):
+        return self.randint_value
+
+
+def _scalar_rooms():
+    rooms = []
+    for i, base_temp in enumerate(BASE_TEMPS):
+        rngs = (_ScriptedRandom(), _ScriptedRandom(), _ScriptedRandom())
+        rooms.append((rngs, TemperatureSensor(base_temp, f"Room {i + 1}", rngs[0]),
+                      PIRSensor(f"Room {i + 1}", rngs[1]), LDRSensor(f"Room {i + 1}", rngs[2])))
+    return rooms
+
+
+def _read_scalar(rooms, hour, draws, ac_on):
+    """One reading of every scalar room; draws are one step's arrays in _draws order."""
+    (_, temp_noise), (_, pir_draws), (_, dwell), (_, ldr_noise) = draws
+    readings = []
+    for i, ((temp_rng, pir_rng, ldr_rng), temperature, pir, ldr) in enumerate(rooms):
+        temperature.set_ac_state(bool(ac_on[i]))
+        temp_rng.uniform_unit = temp_noise[i] / 0.5
+        pir_rng.random_value, pir_rng.randint_value = pir_draws[i], int(dwell[i])
+        ldr_rng.uniform_unit = ldr_noise[i]
+        readings.append((temperature.read(hour), pir.read(hour), ldr.read(hour)))
+    return readings
+
+
+def _ac_schedule(seed):
+    """AC on/off per (step, room), in runs long enough to reach the cooling limit."""
+    rng = np.random.default_rng(seed)
+    return np.repeat(rng.random((STEPS // 24 + 1, len(BASE_TEMPS))) < 0.5, 24, axis=0)[:STEPS]
+
+
+@pytest.mark.parametrize("seed", [0, 7])
+def test_read_matches_scalar_sensors(seed):
+    sensors = SensorArray(BASE_TEMPS)
+    sensors.rng = _ScriptedGenerator()
+    rooms = _scalar_rooms()
+    ac_on = _ac_schedule(seed)
+    for step, hour in enumerate(hours_for_steps(0, STEPS)):
+        draws = _draws((seed, step), len(BASE_TEMPS))
+        expected = _read_scalar(rooms, hour, draws, ac_on[step])
+        sensors.rng.draws = list(draws)
+        sensors.set_ac_state(ac_on[step])
+        got = sensors.read(hour)
+        actual = list(zip(got["temperature"], got["occupancy"], got["light_level"]))
+        assert actual == expected, f"step {step}"
+
+
+@pytest.mark.parametrize("seed", [0, 7])
+def test_read_many_matches_scalar_sensors(seed):
+    draws = _draws(seed, (STEPS, len(BASE_TEMPS)))
+    sensors = SensorArray(BASE_TEMPS)
+    sensors.rng = _ScriptedGenerator()
+    sensors.rng.draws = list(draws)
+    ac_on = _ac_schedule(seed)
+    hours = hours_for_steps(0, STEPS)
+    got = sensors.read_many(hours, ac_on)
+
+    rooms = _scalar_rooms()
+    for step, hour in enumerate(hours):
+        expected = _read_scalar(rooms, hour, [(method, values[step]) for method, values in draws], ac_on[step])
+        actual = list(zip(got["temperature"][step], got["occupancy"][step], got["light_level"][step]))
+        assert actual == expected, f"step {step}"